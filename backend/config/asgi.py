@@ -4,4 +4,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Видеопотоки отдаются корутинами без потока на зрителя, остальное - Django
+from counter.asgi import StreamingRouter  # noqa: E402
+
+application = StreamingRouter(django_application)
@@ -88,3 +88,47 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Бэкенд детектора: "ultralytics" (yolov8n.pt), "onnxruntime" или "opencv" (yolov8n.onnx,
+# см. python -m counting.export), и его параметры (imgsz, threads, providers и т.д.)
+COUNTER_DETECTOR_BACKEND = "ultralytics"
+COUNTER_DETECTOR_OPTIONS = {}
+
+# Веса модели и их загрузка с прогревом при старте сервера (а не на первом кадре подсчета)
+COUNTER_MODEL_WEIGHTS = "yolov8n.pt"
+COUNTER_PRELOAD_MODEL = True
+
+# Детекция только в полосе вокруг линии подсчета (None - по всему кадру):
+# {"band": 0.15, "head_room": 0.35} - полуширина полосы и запас над ней под рост
+# человека в долях высоты кадра
+COUNTER_ROI = None
+
+# Пропуск детекции в статичной пустой сцене: детектор движения по уменьшенному
+# кадру и не более одного прохода модели за idle_interval секунд, пока нет движения
+# и треков дольше cooldown секунд (None - детекция на каждом кадре)
+COUNTER_SCHEDULER = {"idle_interval": 2.0, "cooldown": 1.0}
+COUNTER_MOTION_GATE = {"width": 64, "threshold": 12, "min_changed": 0.002}
+
+# Детекция раз в every кадров, между ними треки продвигаются по прогнозу
+# постоянной скорости, а пересечения линии проверяются на каждом кадре.
+# С target_fps интервал подбирается по задержке модели (не больше max_every)
+COUNTER_DETECT_INTERVAL = {"every": 1, "target_fps": None, "max_every": 4}
+
+# Запись пересечений в базу (CrossingEvent и минутные/часовые агрегаты) пачками
+# из фонового потока: пачка уходит при batch_size событиях или через flush_interval
+# секунд после первого события в ней (None - не сохранять)
+COUNTER_EVENT_STORE = {"batch_size": 100, "flush_interval": 0.5}
+
+# Снимок счетчика, настроек линии и последних событий (JSON, атомарная запись)
+# не чаще раза в interval секунд; восстанавливается при /api/start/ (None - выключено)
+COUNTER_SNAPSHOT = {"path": BASE_DIR / "counter_state.json", "interval": 1.0}
+
+# Воспроизведение записи вместо камеры для нагрузочных прогонов без камеры и модели
+# (None - камера): {"path": "detections.npz", "speed": "realtime", "loop": True}
+# или видеофайл {"path": "video.mp4", "detections": "detections.npz"}; без
+# detections кадры видео обрабатывает модель. speed: realtime, max, 4x или число fps
+COUNTER_REPLAY = None
+
+# Источники многокамерного режима (/api/sources/start/): имя -> индекс камеры,
+# RTSP-адрес, путь к файлу или словарь {"source", "line_position", "line_angle", "mirror"}
+COUNTER_SOURCES = {}
@@ -1 +1,17 @@
 from django.contrib import admin
+
+from .models import CrossingEvent, CrossingRollup
+
+
+@admin.register(CrossingEvent)
+class CrossingEventAdmin(admin.ModelAdmin):
+    list_display = ("timestamp", "source", "direction", "track_id", "count")
+    list_filter = ("source", "direction")
+    date_hierarchy = "timestamp"
+
+
+@admin.register(CrossingRollup)
+class CrossingRollupAdmin(admin.ModelAdmin):
+    list_display = ("bucket", "period", "source", "entered", "exited")
+    list_filter = ("period", "source")
+    date_hierarchy = "bucket"
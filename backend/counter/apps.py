@@ -1,6 +1,71 @@
+import os
+import sys
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+# Корень репозитория с пакетом `counting` (как и в views.py)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+
+def _should_preload_model():
+    """Грузим модель только в процессе, который обслуживает запросы."""
+    if not getattr(settings, "COUNTER_PRELOAD_MODEL", False):
+        return False
+    replay = getattr(settings, "COUNTER_REPLAY", None)
+    if replay is not None:
+        from counting.replay import replays_detections
+
+        # Рамки берутся из записи, и модель (и скачивание весов) не нужна
+        if replays_detections(**replay):
+            return False
+    argv = sys.argv
+    if argv and os.path.basename(argv[0]) == "manage.py":
+        # migrate, createsuperuser и прочие команды модель не используют
+        if len(argv) < 2 or argv[1] != "runserver":
+            return False
+        # При автоперезагрузке запросы обслуживает дочерний процесс с RUN_MAIN=true
+        return os.environ.get("RUN_MAIN") == "true" or "--noreload" in argv
+    return True
+
+
+def _configure_opencv_threads():
+    """Потоки OpenCV DNN задаются на весь процесс, а не в детекторе (`threads`)."""
+    threads = settings.COUNTER_DETECTOR_OPTIONS.get("threads")
+    if settings.COUNTER_DETECTOR_BACKEND == "opencv" and threads:
+        import cv2
+
+        cv2.setNumThreads(threads)
+
+
+def _preload_model():
+    # Веса из COUNTER_DETECTOR_OPTIONS заменяют COUNTER_MODEL_WEIGHTS
+    options = {"weights": settings.COUNTER_MODEL_WEIGHTS, **settings.COUNTER_DETECTOR_OPTIONS}
+    weights = options["weights"]
+    try:
+        from counting.detector import create_detector, model_timings
+
+        create_detector(settings.COUNTER_DETECTOR_BACKEND, **options).warm_up()
+        print(f"Модель {weights} загружена и прогрета: {model_timings().get(weights, {})}")
+    except Exception as e:
+        print(f"Не удалось предзагрузить модель {weights}: {str(e)}")
 
 
 class CounterConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "counter"
+
+    def ready(self):
+        _configure_opencv_threads()
+        if _should_preload_model():
+            # Загружаем в фоне, чтобы не задерживать запуск сервера; детектор,
+            # обратившийся к модели раньше, дождется загрузки на блокировке реестра
+            threading.Thread(
+                target=_preload_model,
+                name="model-preload",
+                daemon=True,
+            ).start()
@@ -0,0 +1,141 @@
+import asyncio
+import json
+from urllib.parse import parse_qsl
+
+from . import views
+from .broadcast import StreamProfile, asse_messages, parse_last_event_id
+from .views import MJPEG_PART_HEADER
+
+SSE_HEADERS = [
+    (b"content-type", b"text/event-stream"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+    # Дашборд открыт с другого порта; для остальных ответов заголовок ставит corsheaders
+    (b"access-control-allow-origin", b"*"),
+]
+
+MJPEG_HEADERS = [
+    (b"content-type", b"multipart/x-mixed-replace; boundary=frame"),
+    # Запрещаем кэширование, чтобы браузер не показывал старые кадры
+    (b"cache-control", b"no-store, no-cache, must-revalidate, max-age=0"),
+    (b"pragma", b"no-cache"),
+    (b"expires", b"0"),
+]
+
+
+async def _send_json(send, payload, status=200):
+    body = json.dumps(payload).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"access-control-allow-origin", b"*"),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def _stream(receive, send, headers, chunks):
+    """Отправляет части бесконечного ответа, пока клиент не отключится.
+
+    Отправка идет отдельной задачей; при отключении клиента она отменяется
+    сразу, даже если генератор ждет следующего события, и его `finally`
+    снимает подписку.
+    """
+
+    async def pump():
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        async for chunk in chunks:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    pump_task = asyncio.ensure_future(pump())
+    watch_task = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        await asyncio.wait({pump_task, watch_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (pump_task, watch_task):
+            task.cancel()
+        await asyncio.gather(pump_task, watch_task, return_exceptions=True)
+        await chunks.aclose()
+
+
+def _stream_profile(scope):
+    return StreamProfile.from_query(dict(parse_qsl(scope.get("query_string", b"").decode())))
+
+
+async def _mjpeg_parts(broadcaster, is_active, profile):
+    async for frame_bytes in broadcaster.aframes(is_active, profile=profile):
+        yield b"".join((MJPEG_PART_HEADER, frame_bytes, b"\r\n"))
+
+
+async def stream_mjpeg(broadcaster, is_active, profile, receive, send):
+    """Отдает MJPEG-поток одному зрителю целиком в цикле событий, без рабочего потока."""
+    parts = _mjpeg_parts(broadcaster, is_active, profile)
+    await _stream(receive, send, MJPEG_HEADERS, parts)
+
+
+async def events_stream(scope, receive, send):
+    """SSE-поток событий подсчета в цикле событий, без рабочего потока."""
+    headers = dict(scope.get("headers") or [])
+    last_event_id = parse_last_event_id(headers.get(b"last-event-id", b"").decode())
+    await _stream(receive, send, SSE_HEADERS, asse_messages(views.event_hub, last_event_id))
+
+
+async def video_feed(scope, receive, send):
+    profile = _stream_profile(scope)
+    await stream_mjpeg(views.frame_broadcaster, views.counter_active, profile, receive, send)
+
+
+async def source_video_feed(scope, receive, send, source):
+    stream = views.source_stream(source)
+    if stream is None:
+        await _send_json(send, {"status": "not_found"}, status=404)
+        return
+    await stream_mjpeg(*stream, _stream_profile(scope), receive, send)
+
+
+class StreamingRouter:
+    """ASGI-приложение, отдающее видеопотоки и SSE в обход Django.
+
+    Django выполняет синхронные части цепочки middleware в отдельном потоке,
+    привязанном к запросу, и держит его, пока открыт ответ - для бесконечного
+    MJPEG- или SSE-потока это поток на каждого зрителя. Здесь длинные
+    GET-запросы видеопотоков и событий обслуживаются корутинами напрямую,
+    остальные запросы передаются приложению Django.
+    """
+
+    def __init__(self, application, prefix="/api/"):
+        self.application = application
+        self.prefix = prefix
+
+    def resolve(self, path):
+        if not path.startswith(self.prefix):
+            return None
+        parts = path[len(self.prefix) :].strip("/").split("/")
+        if parts == ["video_feed"]:
+            return video_feed, ()
+        if parts == ["events"]:
+            return events_stream, ()
+        if len(parts) == 2 and parts[1] == "video_feed":
+            return source_video_feed, (parts[0],)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "GET":
+            route = self.resolve(scope["path"])
+            if route is not None:
+                handler, args = route
+                await handler(scope, receive, send, *args)
+                return
+        await self.application(scope, receive, send)
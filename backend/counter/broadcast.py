@@ -0,0 +1,390 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+
+
+class SequenceNotifier:
+    """Номер последней публикации и ожидание следующей из потоков и корутин.
+
+    Синхронные подписчики ждут на условной переменной. Асинхронные (ASGI) не
+    занимают поток: они ждут на future своего цикла событий, и публикация
+    будит каждый цикл одним вызовом `call_soon_threadsafe`, сколько бы
+    подписчиков в нем ни было.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        # Цикл событий -> future ожидающих в нем асинхронных подписчиков
+        self._async_waiters = {}
+        self.sequence = 0
+        self.viewers = 0
+
+    def _advance(self):
+        """Увеличивает номер и будит подписчиков; вызывается под `self._condition`."""
+        self.sequence += 1
+        self._condition.notify_all()
+        waiters, self._async_waiters = self._async_waiters, {}
+        for loop, futures in waiters.items():
+            try:
+                loop.call_soon_threadsafe(_wake, futures)
+            except RuntimeError:
+                # Цикл событий уже закрыт
+                pass
+
+    def _wait(self, ready, timeout):
+        """Ждет, пока `ready()` станет истинным; вызывается под `self._condition`."""
+        return self._condition.wait_for(ready, timeout)
+
+    async def _wait_async(self, ready, timeout):
+        """Асинхронный вариант `_wait`; вызывается без блокировки."""
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            if ready():
+                return True
+            future = loop.create_future()
+            self._async_waiters.setdefault(loop, []).append(future)
+
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            with self._condition:
+                futures = self._async_waiters.get(loop)
+                if futures and future in futures:
+                    futures.remove(future)
+        with self._condition:
+            return ready()
+
+    def add_viewer(self):
+        with self._condition:
+            self.viewers += 1
+
+    def remove_viewer(self):
+        with self._condition:
+            self.viewers -= 1
+
+
+class StreamProfile(namedtuple("StreamProfile", "fps scale quality")):
+    """Параметры видеопотока зрителя: предел FPS (0 - без предела), масштаб и качество JPEG."""
+
+    __slots__ = ()
+
+    @classmethod
+    def from_query(cls, params):
+        """Профиль из параметров запроса `fps`, `scale`, `quality`; значения ограничиваются."""
+
+        def number(name, default, low, high):
+            try:
+                value = float(params.get(name, default))
+            except (TypeError, ValueError):
+                value = default
+            return min(high, max(low, value))
+
+        return cls(
+            fps=round(number("fps", DEFAULT_PROFILE.fps, 0, 60), 1),
+            scale=round(number("scale", DEFAULT_PROFILE.scale, 0.1, 1.0), 2),
+            quality=int(number("quality", DEFAULT_PROFILE.quality, 10, 95)),
+        )
+
+    def encode(self, frame):
+        """Кодирует кадр в JPEG по профилю; возвращает `memoryview` или None."""
+        if self.scale < 1.0:
+            frame = cv2.resize(
+                frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA
+            )
+        ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return buffer.reshape(-1).data if ok else None
+
+
+# Полный кадр без ограничения FPS, качество JPEG по умолчанию OpenCV
+DEFAULT_PROFILE = StreamProfile(fps=0.0, scale=1.0, quality=95)
+
+
+class FrameBroadcaster(SequenceNotifier):
+    """Раздача последнего закодированного кадра любому числу зрителей.
+
+    Кадр кодируется один раз на каждый профиль качества (`StreamProfile`),
+    который запросил хотя бы один зритель, и только когда подошла очередь по
+    FPS профиля; без зрителей отрисовка и кодирование не выполняются вовсе.
+    Каждый зритель ждет кадр своего профиля новее последнего показанного.
+    Очереди нет: медленный зритель сразу получает самый свежий кадр, а
+    промежуточные для него пропускаются и не отнимаются у других.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # Профиль -> число зрителей
+        self._profiles = {}
+        # Профиль -> (номер кадра профиля, JPEG)
+        self._frames = {}
+        # Профиль -> время последнего кодирования
+        self._encoded_at = {}
+        # Кадры, пропущенные зрителями из-за того, что они не успевали
+        self.skipped = 0
+
+    def due_profiles(self, now=None):
+        """Профили, для которых пора кодировать новый кадр (пусто, если зрителей нет)."""
+        now = time.monotonic() if now is None else now
+        with self._condition:
+            return [
+                profile
+                for profile in self._profiles
+                if not profile.fps
+                or now - self._encoded_at.get(profile, float("-inf")) >= 1.0 / profile.fps
+            ]
+
+    def publish(self, frame, profile=DEFAULT_PROFILE):
+        """Публикует кадр профиля и будит ожидающих зрителей."""
+        with self._condition:
+            number = self._frames.get(profile, (0, None))[0] + 1
+            self._frames[profile] = (number, frame)
+            self._encoded_at[profile] = time.monotonic()
+            self._advance()
+
+    def publish_frame(self, frame, profiles=None):
+        """Кодирует готовый к показу кадр для профилей `profiles` (по умолчанию - кому пора)."""
+        for profile in self.due_profiles() if profiles is None else profiles:
+            encoded = profile.encode(frame)
+            if encoded is not None:
+                self.publish(encoded, profile)
+
+    def clear(self):
+        """Забывает последние кадры, чтобы новые зрители не получили кадр прошлого запуска."""
+        with self._condition:
+            self._frames.clear()
+
+    def _ready(self, profile, last_number):
+        def ready():
+            number, frame = self._frames.get(profile, (0, None))
+            return number != last_number and frame is not None
+
+        return ready
+
+    def _take(self, profile, last_number):
+        number, frame = self._frames[profile]
+        if last_number and number > last_number + 1:
+            self.skipped += number - last_number - 1
+        return number, frame
+
+    def wait_next(self, last_number, timeout=0.5, profile=DEFAULT_PROFILE):
+        """Ждет кадр профиля новее `last_number`.
+
+        Возвращает `(number, frame)`; по истечении `timeout` - `(last_number, None)`.
+        """
+        with self._condition:
+            if not self._wait(self._ready(profile, last_number), timeout):
+                return last_number, None
+            return self._take(profile, last_number)
+
+    async def wait_next_async(self, last_number, timeout=0.5, profile=DEFAULT_PROFILE):
+        """Асинхронный вариант `wait_next`, не блокирующий цикл событий."""
+        if not await self._wait_async(self._ready(profile, last_number), timeout):
+            return last_number, None
+        with self._condition:
+            return self._take(profile, last_number)
+
+    def add_viewer(self, profile=DEFAULT_PROFILE):
+        with self._condition:
+            self.viewers += 1
+            self._profiles[profile] = self._profiles.get(profile, 0) + 1
+
+    def remove_viewer(self, profile=DEFAULT_PROFILE):
+        with self._condition:
+            self.viewers -= 1
+            self._profiles[profile] -= 1
+            if not self._profiles[profile]:
+                # Последний зритель профиля ушел - кадры профиля больше не кодируются
+                del self._profiles[profile]
+                self._frames.pop(profile, None)
+                self._encoded_at.pop(profile, None)
+
+    def frames(self, is_active, timeout=0.5, profile=DEFAULT_PROFILE):
+        """Генератор кадров для одного зрителя, пока `is_active()` истинно."""
+        self.add_viewer(profile)
+        try:
+            number = 0
+            while is_active():
+                number, frame = self.wait_next(number, timeout, profile)
+                if frame is not None:
+                    yield frame
+        finally:
+            self.remove_viewer(profile)
+
+    async def aframes(self, is_active, timeout=0.5, profile=DEFAULT_PROFILE):
+        """Асинхронный генератор кадров для одного зрителя под ASGI."""
+        self.add_viewer(profile)
+        try:
+            number = 0
+            while is_active():
+                number, frame = await self.wait_next_async(number, timeout, profile)
+                if frame is not None:
+                    yield frame
+        finally:
+            self.remove_viewer(profile)
+
+    def stats(self):
+        with self._condition:
+            profiles = [
+                {**profile._asdict(), "viewers": viewers}
+                for profile, viewers in self._profiles.items()
+            ]
+        return {
+            "sequence": self.sequence,
+            "viewers": self.viewers,
+            "skipped": self.skipped,
+            "profiles": profiles,
+        }
+
+
+class EventHub(SequenceNotifier):
+    """Лента событий подсчета (изменения счетчика и пересечения линии) для подписчиков.
+
+    Последние `history` событий хранятся с номерами, поэтому переподключившийся
+    клиент (`Last-Event-ID`) получает пропущенное. Если он отстал больше, чем
+    на историю, вместо потерянных событий он получает текущий счетчик.
+    """
+
+    def __init__(self, history=256):
+        super().__init__()
+        self._events = deque(maxlen=history)
+        self.count = 0
+
+    def publish(self, kind, **payload):
+        with self._condition:
+            if "count" in payload:
+                self.count = payload["count"]
+            self._events.append((self.sequence + 1, kind, payload))
+            self._advance()
+
+    def publish_count(self, count):
+        """Публикует счетчик, только если он изменился."""
+        if count != self.count:
+            self.publish("count", count=count)
+
+    def _since(self, last_sequence):
+        events = [event for event in self._events if event[0] > last_sequence]
+        if events and events[0][0] > last_sequence + 1 and last_sequence:
+            # Часть событий вытеснена из истории - начинаем с актуального счетчика
+            events.insert(0, (events[0][0] - 1, "count", {"count": self.count}))
+        return events
+
+    def wait_events(self, last_sequence, timeout=15.0):
+        """События с номером больше `last_sequence` (пустой список по таймауту)."""
+        with self._condition:
+            if not self._wait(lambda: self.sequence > last_sequence, timeout):
+                return []
+            return self._since(last_sequence)
+
+    async def wait_events_async(self, last_sequence, timeout=15.0):
+        if not await self._wait_async(lambda: self.sequence > last_sequence, timeout):
+            return []
+        with self._condition:
+            return self._since(last_sequence)
+
+    def snapshot(self):
+        """`(sequence, count)` для начального сообщения нового подписчика."""
+        with self._condition:
+            return self.sequence, self.count
+
+    def recent(self, limit=32):
+        """Последние `limit` событий как списки `[id, kind, payload]` для сохранения на диск."""
+        with self._condition:
+            events = list(self._events)[-limit:] if limit else []
+        return [[event_id, kind, payload] for event_id, kind, payload in events]
+
+    def restore(self, sequence, count, events=()):
+        """Продолжает нумерацию и историю событий после перезапуска процесса.
+
+        Если хаб уже ушел дальше сохраненного номера (процесс не перезапускался),
+        восстанавливать нечего; подписчики, переподключившиеся с `Last-Event-ID`
+        из прошлого запуска, получат пропущенные события из истории.
+        """
+        with self._condition:
+            if self.sequence >= sequence:
+                return False
+            self._events.clear()
+            self._events.extend(
+                (event_id, kind, payload)
+                for event_id, kind, payload in events
+                if event_id <= sequence
+            )
+            self.sequence = sequence
+            self.count = count
+            return True
+
+    def stats(self):
+        return {"sequence": self.sequence, "subscribers": self.viewers}
+
+
+def format_sse(kind, payload, event_id=None):
+    """Сообщение Server-Sent Events в байтах."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {kind}")
+    lines.append(f"data: {json.dumps(payload, ensure_ascii=False)}")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+# Комментарий-пинг: держит соединение через прокси и выявляет отключившихся клиентов
+SSE_KEEPALIVE = b": keepalive\n\n"
+
+
+def sse_messages(hub, last_event_id=None, is_active=lambda: True, keepalive=15.0):
+    """Генератор SSE-сообщений для одного подписчика (WSGI)."""
+    hub.add_viewer()
+    try:
+        sequence, count = hub.snapshot()
+        yield b"retry: 2000\n\n"
+        if last_event_id is None or last_event_id > sequence:
+            yield format_sse("count", {"count": count}, sequence)
+        else:
+            sequence = last_event_id
+        while is_active():
+            events = hub.wait_events(sequence, keepalive)
+            if not events:
+                yield SSE_KEEPALIVE
+                continue
+            for event_id, kind, payload in events:
+                yield format_sse(kind, payload, event_id)
+            sequence = events[-1][0]
+    finally:
+        hub.remove_viewer()
+
+
+async def asse_messages(hub, last_event_id=None, is_active=lambda: True, keepalive=15.0):
+    """Асинхронный генератор SSE-сообщений для одного подписчика (ASGI)."""
+    hub.add_viewer()
+    try:
+        sequence, count = hub.snapshot()
+        yield b"retry: 2000\n\n"
+        if last_event_id is None or last_event_id > sequence:
+            yield format_sse("count", {"count": count}, sequence)
+        else:
+            sequence = last_event_id
+        while is_active():
+            events = await hub.wait_events_async(sequence, keepalive)
+            if not events:
+                yield SSE_KEEPALIVE
+                continue
+            for event_id, kind, payload in events:
+                yield format_sse(kind, payload, event_id)
+            sequence = events[-1][0]
+    finally:
+        hub.remove_viewer()
+
+
+def parse_last_event_id(value):
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _wake(futures):
+    for future in futures:
+        if not future.done():
+            future.set_result(None)
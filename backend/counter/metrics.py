@@ -0,0 +1,73 @@
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Перцентили задержек в метриках-сводках
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class PrometheusText:
+    """Сборщик метрик в текстовом формате Prometheus.
+
+    Семейства выводятся в порядке первого добавления, у каждого один раз
+    `# HELP` и `# TYPE`. Значения собираются только в момент запроса
+    `/api/metrics/`, поэтому без опроса метрики ничего не стоят.
+    """
+
+    def __init__(self, prefix="people_counter_"):
+        self.prefix = prefix
+        self._families = {}
+
+    def _family(self, name, kind, help_text):
+        name = self.prefix + name
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = (kind, help_text, [])
+        return name, family[2]
+
+    def add(self, name, kind, help_text, value, labels=None):
+        """Добавляет значение метрики типа "gauge" или "counter"."""
+        name, samples = self._family(name, kind, help_text)
+        samples.append(f"{name}{_labels(labels)} {_number(value)}")
+
+    def gauge(self, name, help_text, value, labels=None):
+        self.add(name, "gauge", help_text, value, labels)
+
+    def counter(self, name, help_text, value, labels=None):
+        self.add(name, "counter", help_text, value, labels)
+
+    def summary(self, name, help_text, stats, labels=None):
+        """Сводка задержек `StageStats`: перцентили по окну, сумма и число, в секундах."""
+        name, samples = self._family(name, "summary", help_text)
+        labels = labels or {}
+        for quantile, seconds in stats.percentiles(QUANTILES).items():
+            samples.append(
+                f"{name}{_labels({**labels, 'quantile': quantile})} {_number(seconds)}"
+            )
+        samples.append(f"{name}_sum{_labels(labels)} {_number(stats.total_seconds)}")
+        samples.append(f"{name}_count{_labels(labels)} {_number(stats.processed)}")
+
+    def render(self):
+        lines = []
+        for name, (kind, help_text, samples) in self._families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrossingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(blank=True, default='', max_length=64)),
+                ('direction', models.CharField(choices=[('in', 'Вход'), ('out', 'Выход')], max_length=3)),
+                ('track_id', models.IntegerField()),
+                ('timestamp', models.DateTimeField()),
+                ('count', models.IntegerField()),
+            ],
+            options={
+                'ordering': ['timestamp'],
+                'indexes': [models.Index(fields=['source', 'timestamp'], name='counter_cro_source_dd72b2_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CrossingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('minute', 'Минута'), ('hour', 'Час')], max_length=6)),
+                ('source', models.CharField(blank=True, default='', max_length=64)),
+                ('bucket', models.DateTimeField()),
+                ('entered', models.PositiveIntegerField(default=0)),
+                ('exited', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['bucket'],
+                'constraints': [models.UniqueConstraint(fields=('period', 'source', 'bucket'), name='unique_crossing_rollup')],
+            },
+        ),
+    ]
@@ -1 +1,49 @@
 from django.db import models
+
+
+class CrossingEvent(models.Model):
+    """Пересечение линии подсчета: источник, направление, трек и счетчик после него."""
+
+    DIRECTION_CHOICES = [("in", "Вход"), ("out", "Выход")]
+
+    # Имя источника многокамерного режима; пустая строка - одиночный режим
+    source = models.CharField(max_length=64, blank=True, default="")
+    direction = models.CharField(max_length=3, choices=DIRECTION_CHOICES)
+    track_id = models.IntegerField()
+    timestamp = models.DateTimeField()
+    count = models.IntegerField()
+
+    class Meta:
+        ordering = ["timestamp"]
+        indexes = [models.Index(fields=["source", "timestamp"])]
+
+    def __str__(self):
+        return f"{self.timestamp:%Y-%m-%d %H:%M:%S} {self.source or '-'} {self.direction}"
+
+
+class CrossingRollup(models.Model):
+    """Число входов и выходов источника за минуту или час.
+
+    Агрегаты пополняются вместе с записью событий, поэтому статистика за
+    любой период читается по числу интервалов, а не по числу событий.
+    """
+
+    PERIOD_CHOICES = [("minute", "Минута"), ("hour", "Час")]
+
+    period = models.CharField(max_length=6, choices=PERIOD_CHOICES)
+    source = models.CharField(max_length=64, blank=True, default="")
+    # Начало интервала (UTC)
+    bucket = models.DateTimeField()
+    entered = models.PositiveIntegerField(default=0)
+    exited = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["bucket"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "source", "bucket"], name="unique_crossing_rollup"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.bucket:%Y-%m-%d %H:%M} {self.source or '-'}"
@@ -0,0 +1,213 @@
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from counting.camera import open_source
+from counting.detector import PeopleDetector
+from counting.engine import CountingEngine
+from .broadcast import FrameBroadcaster
+from .pipeline import (
+    DropOldestQueue,
+    FramePacket,
+    FrameRing,
+    PipelineStage,
+    StageStats,
+    broadcast_packet,
+    release_item,
+)
+
+
+class CameraSource:
+    """Один вход (камера, RTSP-поток или файл) со своим захватом, подсчетом и выдачей кадров."""
+
+    def __init__(self, name, source, stop_event, line_position=50, line_angle=0, mirror=None):
+        self.name = name
+        self.source = source
+        self.cap = open_source(source)
+        # Зеркалим только локальные веб-камеры, как и в одиночном режиме
+        if mirror is None:
+            mirror = isinstance(source, int) or str(source).isdigit()
+        self.mirror = mirror
+        self.engine = CountingEngine(line_position=line_position, line_angle=line_angle)
+        self.frame_index = 0
+
+        self.inference_queue = DropOldestQueue(1)
+        self.render_queue = DropOldestQueue(2)
+        self.broadcaster = FrameBroadcaster()
+        self.ring = FrameRing(size=6)
+        self.stages = [
+            PipelineStage(
+                f"{name}-capture",
+                self._capture_frame,
+                stop_event,
+                out_queue=self.inference_queue,
+            ),
+            PipelineStage(
+                f"{name}-render",
+                self._render_frame,
+                stop_event,
+                in_queue=self.render_queue,
+            ),
+        ]
+
+    @property
+    def count(self):
+        return self.engine.people_inside
+
+    def _capture_frame(self, _):
+        buffer = self.ring.acquire()
+        ret, frame = self.cap.read(buffer)
+        if not ret:
+            self.ring.release(buffer)
+            time.sleep(0.01)
+            return None
+        if self.mirror:
+            cv2.flip(frame, 1, dst=frame)
+        self.frame_index += 1
+        return FramePacket(self.frame_index, frame, self.ring)
+
+    def _render_frame(self, packet):
+        broadcast_packet(packet, self.broadcaster)
+        return None
+
+    def release(self):
+        try:
+            self.cap.release()
+        except Exception:
+            pass
+
+
+class BatchInferenceServer(threading.Thread):
+    """Собирает свежие кадры всех источников и детектирует их одним проходом YOLO.
+
+    Каждый тик берет не больше одного кадра от каждого источника, у которого
+    есть новый кадр, запускает `detect_batch` и раздает детекции в ядра подсчета
+    соответствующих источников.
+    """
+
+    def __init__(self, sources, detector, stop_event, writer=None):
+        super().__init__(name="batch-inference", daemon=True)
+        self.sources = sources
+        self.detector = detector
+        self.stop_event = stop_event
+        self.stats = StageStats("batch-inference")
+        self.frames_processed = 0
+        # `CrossingWriter` для сохранения пересечений или None
+        self.writer = writer
+
+    def run(self):
+        while not self.stop_event.is_set():
+            batch = []
+            for source in self.sources:
+                try:
+                    batch.append((source, source.inference_queue.get_nowait()))
+                except queue.Empty:
+                    pass
+
+            if not batch:
+                time.sleep(0.002)
+                continue
+
+            started = time.perf_counter()
+            try:
+                detections = self.detector.detect_batch([p.frame for _, p in batch])
+                for (source, packet), boxes in zip(batch, detections):
+                    frame = packet.frame
+                    result = source.engine.update(boxes, frame.shape[1], frame.shape[0])
+                    if self.writer:
+                        for event in result.events:
+                            self.writer.record(event, result.count, source.name)
+                    packet.apply_result(result)
+                    release_item(source.render_queue.put_latest(packet))
+            except Exception as e:
+                print(f"Ошибка пакетного инференса: {str(e)}")
+                self.stop_event.set()
+                break
+
+            self.stats.record(time.perf_counter() - started)
+            self.frames_processed += len(batch)
+
+
+class MultiSourceManager:
+    """Запускает несколько источников с общим пакетным сервером инференса."""
+
+    def __init__(self, sources_config, detector=None, writer=None):
+        self.stop_event = threading.Event()
+        self.sources = {}
+        for name, config in sources_config.items():
+            if not isinstance(config, dict):
+                config = {"source": config}
+            self.sources[name] = CameraSource(
+                name,
+                config["source"],
+                self.stop_event,
+                line_position=config.get("line_position", 50),
+                line_angle=config.get("line_angle", 0),
+                mirror=config.get("mirror"),
+            )
+        self.server = BatchInferenceServer(
+            list(self.sources.values()),
+            detector or PeopleDetector(max_det=50),
+            self.stop_event,
+            writer,
+        )
+        self._started_at = None
+        self._started_cpu = None
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        self._started_cpu = time.process_time()
+        for source in self.sources.values():
+            for stage in source.stages:
+                stage.start()
+        self.server.start()
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        threads = [self.server]
+        for source in self.sources.values():
+            threads.extend(source.stages)
+        for thread in threads:
+            if thread.is_alive():
+                thread.join(timeout=timeout)
+        for source in self.sources.values():
+            source.release()
+
+    def is_alive(self):
+        return not self.stop_event.is_set() and self.server.is_alive()
+
+    def get(self, name):
+        return self.sources.get(name)
+
+    def stats(self):
+        """Пропускная способность по источникам и в пересчете на ядро CPU."""
+        elapsed = max(time.perf_counter() - (self._started_at or time.perf_counter()), 1e-6)
+        cpu_time = time.process_time() - (self._started_cpu or time.process_time())
+        total_fps = self.server.frames_processed / elapsed
+        batches = self.server.stats.processed
+        # Сколько ядер процесс реально занимал в среднем за время работы
+        cores_busy = cpu_time / elapsed
+        cpu_count = os.cpu_count() or 1
+        return {
+            "sources": {
+                name: {
+                    "count": source.count,
+                    "fps": round(source.stages[1].stats.processed / elapsed, 2),
+                    "viewers": source.broadcaster.viewers,
+                    "viewer_skipped": source.broadcaster.skipped,
+                }
+                for name, source in self.sources.items()
+            },
+            "batch": {
+                **self.server.stats.snapshot(),
+                "avg_size": round(self.server.frames_processed / batches, 2) if batches else 0.0,
+            },
+            "total_fps": round(total_fps, 2),
+            "cpu_count": cpu_count,
+            "cores_busy": round(cores_busy, 2),
+            "fps_per_core": round(total_fps / cpu_count, 2),
+            "fps_per_busy_core": round(total_fps / cores_busy, 2) if cores_busy else 0.0,
+        }
@@ -0,0 +1,331 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+
+
+class DropOldestQueue(queue.Queue):
+    """Ограниченная очередь, которая при переполнении вытесняет самый старый элемент.
+
+    Используется между стадиями конвейера: медленная стадия всегда получает
+    самый свежий кадр, а не накапливает отставание. С `block=True` кадры не
+    вытесняются: передающая стадия ждет места в очереди (воспроизведение
+    записи, где важен каждый кадр, а не задержка).
+    """
+
+    def __init__(self, maxsize=2, block=False):
+        super().__init__(maxsize)
+        self.block = block
+        self.dropped = 0
+
+    def put_latest(self, item):
+        """Кладет элемент без блокировки, при необходимости выбрасывая самый старый.
+
+        Возвращает вытесненный элемент (или `None`), чтобы вызывающий мог
+        вернуть его буфер в пул.
+        """
+        dropped = None
+        with self.mutex:
+            if 0 < self.maxsize <= self._qsize():
+                dropped = self._get()
+                self.unfinished_tasks -= 1
+                self.dropped += 1
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+        return dropped
+
+
+class FrameRing:
+    """Пул переиспользуемых буферов кадров.
+
+    Захват читает кадр прямо в свободный буфер (`cap.read(buffer)`) и
+    зеркалит его на месте, отрисовка рисует в том же буфере, после чего пакет
+    возвращает буфер в пул. Новые массивы выделяются, только пока в обработке
+    больше кадров, чем буферов в пуле (или при смене размера кадра).
+    """
+
+    def __init__(self, size=8):
+        self.size = size
+        self._free = deque()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        # Сколько раз свободного буфера не нашлось и кадр был выделен заново
+        self.misses = 0
+
+    def acquire(self):
+        """Свободный буфер или `None`, если его нет (тогда `cap.read` выделит новый)."""
+        with self._lock:
+            self.acquired += 1
+            if self._free:
+                return self._free.pop()
+            self.misses += 1
+            return None
+
+    def release(self, buffer):
+        if buffer is None:
+            return
+        with self._lock:
+            if len(self._free) < self.size:
+                self._free.append(buffer)
+
+    def stats(self):
+        return {"size": self.size, "free": len(self._free), "misses": self.misses}
+
+
+def release_item(item):
+    """Возвращает буфер пакета в пул, если элемент его держит."""
+    release = getattr(item, "release", None)
+    if release is not None:
+        release()
+
+
+class StageStats:
+    """Скользящая статистика задержек одной стадии конвейера.
+
+    Запись стоит одного `append` в ограниченную очередь; перцентили и FPS
+    считаются только при чтении статистики.
+    """
+
+    def __init__(self, name, window=120):
+        self.name = name
+        self.processed = 0
+        # Суммарное время за все время работы (для `_sum` метрик Prometheus)
+        self.total_seconds = 0.0
+        # Пары (время окончания, задержка) последних `window` кадров
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.processed += 1
+        self.total_seconds += seconds
+        self._samples.append((time.perf_counter(), seconds))
+
+    def percentiles(self, quantiles=(0.5, 0.9, 0.99)):
+        """Перцентили задержки по окну, в секундах (`{q: seconds}`, пусто без данных)."""
+        latencies = sorted(seconds for _, seconds in self._samples)
+        if not latencies:
+            return {}
+        last = len(latencies) - 1
+        return {q: latencies[min(last, round(q * last))] for q in quantiles}
+
+    def fps(self, idle_after=1.0):
+        """Скользящая частота по окну; 0, если стадия простаивает дольше `idle_after` секунд."""
+        samples = list(self._samples)
+        if len(samples) < 2 or time.perf_counter() - samples[-1][0] > idle_after:
+            return 0.0
+        elapsed = samples[-1][0] - samples[0][0]
+        return (len(samples) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self):
+        """Возвращает число обработанных кадров и задержки стадии в миллисекундах."""
+        latencies = [seconds for _, seconds in self._samples]
+        if not latencies:
+            return {"processed": self.processed, "last_ms": 0.0, "avg_ms": 0.0, "max_ms": 0.0}
+        p95 = sorted(latencies)[min(len(latencies) - 1, round(0.95 * (len(latencies) - 1)))]
+        return {
+            "processed": self.processed,
+            "last_ms": round(latencies[-1] * 1000, 2),
+            "avg_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+            "p95_ms": round(p95 * 1000, 2),
+            "max_ms": round(max(latencies) * 1000, 2),
+            "fps": round(self.fps(), 2),
+        }
+
+
+class FramePacket:
+    """Кадр и результаты его обработки, передаваемые между стадиями."""
+
+    __slots__ = (
+        "index",
+        "captured_at",
+        "frame",
+        "ring",
+        "recorded",
+        "line",
+        "boxes",
+        "tracks",
+        "count",
+    )
+
+    def __init__(self, index, frame, ring=None, recorded=None):
+        self.index = index
+        self.captured_at = time.perf_counter()
+        self.frame = frame
+        # Пул, которому принадлежит буфер кадра
+        self.ring = ring
+        # Записанные рамки кадра при воспроизведении записи детекций, иначе None
+        self.recorded = recorded
+        self.line = None
+        self.boxes = []
+        self.tracks = {}
+        self.count = 0
+
+    def release(self):
+        """Возвращает буфер кадра в пул; после этого кадр пакета недоступен."""
+        if self.ring is not None:
+            self.ring.release(self.frame)
+            self.ring = None
+            self.frame = None
+
+    def apply_result(self, result):
+        """Переносит в пакет линию, рамки и треки из `FrameResult` ядра подсчета."""
+        self.line = result.line
+        self.boxes = [box for _, box, _, _ in result.tracks]
+        self.tracks = {track_id: position for track_id, _, position, _ in result.tracks}
+        self.count = result.count
+
+
+def draw_packet(packet):
+    """Рисует линию, рамки и точки ног прямо в буфере пакета (он больше никому не нужен)."""
+    display_frame = packet.frame
+    line_start, line_end = packet.line
+    cv2.line(display_frame, line_start, line_end, (255, 0, 0), 2)
+
+    for x1, y1, x2, y2 in packet.boxes:
+        cv2.rectangle(display_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+    for foot_position in packet.tracks.values():
+        cv2.circle(display_frame, foot_position, 5, (0, 0, 255), -1)
+    return display_frame
+
+
+def broadcast_packet(packet, broadcaster, timings=None):
+    """Публикует кадр пакета зрителям `broadcaster` в каждом нужном профиле качества.
+
+    Если зрителей нет или ни одному профилю еще не пора по FPS, кадр не
+    рисуется и не кодируется. В `timings` (словарь `StageStats`) при наличии
+    записываются шаги "draw" и "encode".
+    """
+    profiles = broadcaster.due_profiles()
+    if not profiles:
+        return
+    started = time.perf_counter()
+    frame = draw_packet(packet)
+    drawn = time.perf_counter()
+    broadcaster.publish_frame(frame, profiles)
+    if timings is not None:
+        timings["draw"].record(drawn - started)
+        timings["encode"].record(time.perf_counter() - drawn)
+
+
+class PipelineStage(threading.Thread):
+    """Поток одной стадии: берет пакет из входной очереди, обрабатывает и передает дальше.
+
+    Стадия без входной очереди (захват) вызывает обработчик в цикле с `None`.
+    Если обработчик вернул `None`, пакет дальше не передается и его буфер
+    возвращается в пул; так же освобождаются пакеты, вытесненные из очереди.
+    """
+
+    def __init__(self, name, handler, stop_event, in_queue=None, out_queue=None):
+        super().__init__(name=f"pipeline-{name}", daemon=True)
+        self.handler = handler
+        self.stop_event = stop_event
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.stats = StageStats(name)
+        self.error = None
+
+    def run(self):
+        while not self.stop_event.is_set():
+            item = None
+            if self.in_queue is not None:
+                try:
+                    item = self.in_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+            started = time.perf_counter()
+            try:
+                result = self.handler(item)
+            except Exception as e:
+                print(f"Ошибка в стадии {self.stats.name}: {str(e)}")
+                self.error = e
+                self.stop_event.set()
+                break
+            self.stats.record(time.perf_counter() - started)
+
+            if result is not item:
+                release_item(item)
+            if result is not None and self.out_queue is not None:
+                self._forward(result)
+
+    def _forward(self, item):
+        if not self.out_queue.block:
+            release_item(self.out_queue.put_latest(item))
+            return
+        # Без потерь: ждем места в очереди, пока конвейер не остановлен
+        while not self.stop_event.is_set():
+            try:
+                self.out_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        release_item(item)
+
+
+class FramePipeline:
+    """Конвейер захват → инференс → отрисовка/кодирование на отдельных потоках.
+
+    Стадии связаны ограниченными очередями с вытеснением старых кадров, поэтому
+    чтение камеры и кодирование JPEG перекрываются с инференсом, а пропускная
+    способность определяется самой медленной стадией, а не суммой всех стадий.
+    С `lossless=True` захват ждет инференс вместо вытеснения кадров.
+    """
+
+    def __init__(self, capture, infer, render, queue_size=2, lossless=False):
+        self.stop_event = threading.Event()
+        # Буферов хватает на все кадры в работе: по одному в каждой стадии и
+        # заполненные очереди между ними
+        self.ring = FrameRing(size=3 + 2 * queue_size + 1)
+        self.inference_queue = DropOldestQueue(queue_size, block=lossless)
+        self.render_queue = DropOldestQueue(queue_size)
+        self.stages = [
+            PipelineStage(
+                "capture", capture, self.stop_event, out_queue=self.inference_queue
+            ),
+            PipelineStage(
+                "inference",
+                infer,
+                self.stop_event,
+                in_queue=self.inference_queue,
+                out_queue=self.render_queue,
+            ),
+            PipelineStage(
+                "render", render, self.stop_event, in_queue=self.render_queue
+            ),
+        ]
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self, timeout=2.0):
+        """Останавливает все стадии и ждет их завершения."""
+        self.stop_event.set()
+        current = threading.current_thread()
+        for stage in self.stages:
+            if stage.is_alive() and stage is not current:
+                stage.join(timeout=timeout)
+
+    def is_alive(self):
+        return not self.stop_event.is_set() and all(
+            stage.is_alive() for stage in self.stages
+        )
+
+    def stats(self):
+        """Снимок задержек стадий и состояния очередей."""
+        return {
+            "stages": {stage.stats.name: stage.stats.snapshot() for stage in self.stages},
+            "queues": {
+                "inference": {
+                    "size": self.inference_queue.qsize(),
+                    "dropped": self.inference_queue.dropped,
+                },
+                "render": {
+                    "size": self.render_queue.qsize(),
+                    "dropped": self.render_queue.dropped,
+                },
+            },
+            "frame_ring": self.ring.stats(),
+        }
@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import time
+
+SNAPSHOT_VERSION = 1
+
+
+def write_snapshot(path, state):
+    """Атомарно записывает состояние в JSON-файл.
+
+    Данные пишутся во временный файл в том же каталоге, сбрасываются на диск
+    и подменяют старый файл через `os.replace`, поэтому при падении процесса
+    на диске остается либо прежний, либо новый снимок целиком.
+    """
+    path = os.fspath(path)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".snapshot-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": SNAPSHOT_VERSION, **state}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_snapshot(path):
+    """Читает снимок; None, если файла нет, он поврежден или другой версии."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Не удалось прочитать снимок состояния {path}: {str(e)}")
+        return None
+    if not isinstance(state, dict) or state.get("version") != SNAPSHOT_VERSION:
+        return None
+    return state
+
+
+class SnapshotWriter:
+    """Периодически сохраняет состояние счетчика, если оно изменилось.
+
+    `save` вызывается часто (из цикла управления потоком подсчета), а на
+    диск попадает не чаще раза в `interval` секунд и только при изменениях.
+    """
+
+    def __init__(self, path, interval=1.0, clock=time.monotonic):
+        self.path = path
+        self.interval = interval
+        self.clock = clock
+        self._last_state = None
+        self._saved_at = None
+        self.writes = 0
+        self.errors = 0
+
+    def save(self, state, force=False):
+        """Записывает `state`, если он изменился и подошел срок (или `force`)."""
+        if state == self._last_state:
+            return False
+        now = self.clock()
+        if not force and self._saved_at is not None and now - self._saved_at < self.interval:
+            return False
+        try:
+            write_snapshot(self.path, {**state, "saved_at": time.time()})
+        except OSError as e:
+            self.errors += 1
+            print(f"Не удалось сохранить снимок состояния: {str(e)}")
+            return False
+        self._last_state = state
+        self._saved_at = now
+        self.writes += 1
+        return True
+
+    def stats(self):
+        return {"path": str(self.path), "writes": self.writes, "errors": self.errors}
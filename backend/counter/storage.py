@@ -0,0 +1,186 @@
+import queue
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDay
+
+from .models import CrossingEvent, CrossingRollup
+
+ROLLUP_PERIODS = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1)}
+
+
+def rollup_bucket(moment, period):
+    """Начало минуты или часа, к которому относится момент времени."""
+    if period == "minute":
+        return moment.replace(second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _add_to_rollup(period, source, bucket, entered, exited):
+    """Прибавляет входы и выходы к агрегату, создавая его при первом событии интервала.
+
+    Приращение выполняется в базе (`F`), поэтому параллельные записи из
+    нескольких процессов не теряют друг друга. Если агрегат одновременно
+    создал другой процесс, откатывается только вставка (точка сохранения), и
+    агрегат пополняется повторно.
+    """
+    rollups = CrossingRollup.objects.filter(period=period, source=source, bucket=bucket)
+    increment = {"entered": F("entered") + entered, "exited": F("exited") + exited}
+    if rollups.update(**increment):
+        return
+    try:
+        with transaction.atomic():
+            CrossingRollup.objects.create(
+                period=period, source=source, bucket=bucket, entered=entered, exited=exited
+            )
+    except IntegrityError:
+        rollups.update(**increment)
+
+
+def save_crossings(rows):
+    """Записывает пачку пересечений и пополняет минутные и часовые агрегаты.
+
+    `rows` - кортежи `(source, direction, track_id, timestamp, count)`, где
+    `timestamp` - время Unix. Все изменения выполняются одной транзакцией.
+    """
+    events = [
+        CrossingEvent(
+            source=source,
+            direction=direction,
+            track_id=track_id,
+            timestamp=datetime.fromtimestamp(timestamp, tz=timezone.utc),
+            count=count,
+        )
+        for source, direction, track_id, timestamp, count in rows
+    ]
+
+    deltas = {}
+    for event in events:
+        for period in ROLLUP_PERIODS:
+            key = (period, event.source, rollup_bucket(event.timestamp, period))
+            entered, exited = deltas.get(key, (0, 0))
+            if event.direction == "in":
+                deltas[key] = (entered + 1, exited)
+            else:
+                deltas[key] = (entered, exited + 1)
+
+    with transaction.atomic():
+        CrossingEvent.objects.bulk_create(events)
+        for (period, source, bucket), (entered, exited) in deltas.items():
+            _add_to_rollup(period, source, bucket, entered, exited)
+    return len(events)
+
+
+def crossing_series(start, end, bucket="hour", source=""):
+    """Входы и выходы источника по интервалам `bucket` ("minute", "hour", "day") в `[start, end)`.
+
+    Читаются только агрегаты: минутные для "minute", часовые для "hour" и "day".
+    """
+    period = "minute" if bucket == "minute" else "hour"
+    rollups = CrossingRollup.objects.filter(
+        period=period, source=source, bucket__gte=rollup_bucket(start, period), bucket__lt=end
+    )
+    if bucket == "day":
+        rows = (
+            rollups.annotate(day=TruncDay("bucket"))
+            .values("day")
+            .order_by("day")
+            .annotate(entered_sum=Sum("entered"), exited_sum=Sum("exited"))
+        )
+        return [(row["day"], row["entered_sum"], row["exited_sum"]) for row in rows]
+    return list(rollups.values_list("bucket", "entered", "exited"))
+
+
+class CrossingWriter(threading.Thread):
+    """Фоновая запись пересечений в базу пачками.
+
+    Поток подсчета только кладет событие в очередь и никогда не ждет базу.
+    Пачка записывается, когда набралось `batch_size` событий или с первого
+    события в ней прошло `flush_interval` секунд. Если база не успевает и
+    очередь заполнена, новые события отбрасываются и учитываются в `dropped`.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=0.5, max_pending=10000):
+        super().__init__(name="crossing-writer", daemon=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def ensure_started(self):
+        with self._start_lock:
+            if not self.is_alive():
+                self.start()
+
+    def record(self, event, count, source=""):
+        """Ставит `CrossingEvent` движка подсчета в очередь записи без блокировки."""
+        try:
+            self._queue.put_nowait(
+                (source, event.direction, event.track_id, event.timestamp, count)
+            )
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=2.0):
+        """Дожидается записи всего, что было поставлено в очередь до вызова."""
+        if not self.is_alive():
+            return False
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, threading.Event):
+                self._write(batch)
+                batch = []
+                item.set()
+                continue
+            if item is not None:
+                batch.append(item)
+                if len(batch) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size and time.monotonic() < deadline:
+                    continue
+
+            self._write(batch)
+            batch = []
+
+    def _write(self, batch):
+        if not batch:
+            return
+        # Соединение потока могло устареть за время простоя
+        close_old_connections()
+        try:
+            self.written += save_crossings(batch)
+            self.batches += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"Ошибка записи пересечений: {str(e)}")
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
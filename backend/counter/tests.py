@@ -1 +1,117 @@
-from django.test import TestCase
+import os
+import sys
+
+from django.test import SimpleTestCase
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from counting.engine import CountingEngine
+from counting.sharded import TRACK_ID_STRIDE, plan_segments
+from counting.tracker import PeopleTracker
+from counting.trajectories import Trajectories, TrajectoryRecorder, recount
+
+
+def run_engine(foot_ys, every=4, width=640, height=360):
+    """Прогоняет одного человека с точкой ног на `foot_ys` (детекция раз в `every` кадров)."""
+    engine = CountingEngine()
+    events = []
+    for index, y in enumerate(foot_ys):
+        if index % every == 0:
+            result = engine.update([[300, y - 100, 340, y]], width, height)
+        else:
+            result = engine.propagate(width, height)
+        events.extend((event.direction, event.frame_index) for event in result.events)
+    return engine, events
+
+
+def walking_boxes(index):
+    """Рамки кадра `index`: люди идут вниз через линию y=180 (кадр 640x360)."""
+    boxes = []
+    # Начало пути и x человека; линию пересекают на кадре `first + 80`, в том
+    # числе на первых кадрах сегментов 100 и 200
+    for first, x in [(0, 60), (18, 200), (50, 340), (118, 480), (170, 120)]:
+        y = 100 + index - first
+        if 0 <= index - first < 160:
+            boxes.append([x - 20, y - 100, x + 20, y])
+    return boxes
+
+
+def track_frames(frames, stride, start=None):
+    """Траектории `CountingEngine` по кадрам `frames` с шагом `stride` (как в count_video)."""
+    engine = CountingEngine(tracker=PeopleTracker(max_distance=100 * stride))
+    recorder = TrajectoryRecorder()
+    events = []
+    for index in frames:
+        if index % stride:
+            continue
+        result = engine.update(walking_boxes(index), 640, 360, frame_index=index)
+        recorder.add(result)
+        events.extend(event for event in result.events if start is None or index >= start)
+    return recorder.trajectories(width=640, height=360), events
+
+
+class ShardedRecountTests(SimpleTestCase):
+    """Пересчет по траекториям сегментов совпадает с однопроцессным прогоном."""
+
+    def test_recount_with_stride(self):
+        stride, total = 4, 300
+        single, single_events = track_frames(range(total), stride)
+        parts = []
+        sharded_events = []
+        for index, (warmup_start, start, end) in enumerate(plan_segments(total, 3, 10)):
+            # Как `_process_segment`: прогрев с `warmup_start`, события с `start`
+            tracks, events = track_frames(range(warmup_start, end), stride, start)
+            tracks = tracks.since(start)
+            tracks.track_ids += index * TRACK_ID_STRIDE
+            parts.append(tracks)
+            sharded_events.extend(events)
+
+        lines = [(50, 0), (40, 0), (60, 10)]
+        expected = recount(single, lines)
+        self.assertEqual(expected[0]["in"] + expected[0]["out"], len(single_events))
+        self.assertEqual(len(sharded_events), len(single_events))
+        self.assertEqual(recount(Trajectories.concatenate(parts), lines), expected)
+
+
+class PropagatedCrossingTests(SimpleTestCase):
+    """Пересечения линии на кадрах без детекции (линия на y=180 при кадре 640x360)."""
+
+    def test_stop_before_line_gives_no_events(self):
+        # Прогноз уводит трек за линию, но человек остановился перед ней
+        engine, events = run_engine([270, 250, 230, 210, 190] + [190] * 12)
+        self.assertEqual(events, [])
+        self.assertEqual(engine.people_inside, 0)
+
+    def test_confirmed_crossing_keeps_predicted_frame(self):
+        engine, events = run_engine([272 - 15 * index for index in range(20)])
+        # Засчитано одно пересечение с кадром прогноза, а не следующей детекции
+        self.assertEqual(events, [("out", 7)])
+
+    def test_crossing_without_propagation(self):
+        engine, events = run_engine([200, 190, 170, 160], every=1)
+        self.assertEqual(events, [("out", 2)])
+
+
+class PointOnLineTests(SimpleTestCase):
+    """Точка ровно на линии (y=180) не относится ни к одной стороне."""
+
+    def test_touching_line_gives_no_events(self):
+        # Человек дошел до линии и вернулся - с любой стороны
+        for foot_ys in ([200, 190, 180, 190, 200], [160, 170, 180, 170, 160]):
+            engine, events = run_engine(foot_ys, every=1)
+            self.assertEqual(events, [])
+
+    def test_recount_matches_engine_on_line(self):
+        engine = CountingEngine()
+        recorder = TrajectoryRecorder()
+        events = []
+        for index, y in enumerate([200, 180, 200, 190, 170, 180, 160]):
+            result = engine.update([[300, y - 100, 340, y]], 640, 360, frame_index=index)
+            recorder.add(result)
+            events.extend(event.direction for event in result.events)
+        # Засчитан только шаг с 190 на 170 через линию, а не касания линии
+        self.assertEqual(events, ["out"])
+        totals = recount(recorder.trajectories(width=640, height=360), [(50, 0)])[0]
+        self.assertEqual((totals["in"], totals["out"]), (0, 1))
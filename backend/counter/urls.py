@@ -6,7 +6,16 @@ urlpatterns = [
     path("start/", views.StartCounterView.as_view(), name="start_counter"),
     path("stop/", views.StopCounterView.as_view(), name="stop_counter"),
     path("video_feed/", views.video_feed, name="video_feed"),
-    path("count/", views.GetCountView.as_view(), name="get_count"),
+    path("count/", views.get_count, name="get_count"),
+    path("events/", views.events_stream, name="events"),
     path("update_line/", views.UpdateLineSettingsView.as_view(), name="update_line"),
     path("start_counting/", views.StartCountingView.as_view(), name="start_counting"),
+    path("stats/", views.PipelineStatsView.as_view(), name="pipeline_stats"),
+    path("history/", views.CrossingHistoryView.as_view(), name="crossing_history"),
+    path("metrics/", views.metrics, name="metrics"),
+    path("sources/start/", views.StartSourcesView.as_view(), name="start_sources"),
+    path("sources/stop/", views.StopSourcesView.as_view(), name="stop_sources"),
+    path("sources/stats/", views.SourcesStatsView.as_view(), name="sources_stats"),
+    path("<str:source>/count/", views.source_count, name="source_count"),
+    path("<str:source>/video_feed/", views.source_video_feed, name="source_video_feed"),
 ]
@@ -1,5 +1,8 @@
+from django.conf import settings
 from django.shortcuts import render
-from django.http import JsonResponse, StreamingHttpResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework.views import APIView
 from rest_framework.response import Response
 import cv2
@@ -9,95 +12,164 @@ import threading
 import queue
 import sys
 import os
-import tkinter as tk
+import time
+from datetime import timedelta
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-sys.path.append(BASE_DIR)
-
-from people_counter import PeopleCounter
-
-frame_queue = queue.Queue(maxsize=10)
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from counting.detector import create_detector, model_timings
+from counting.headless import HeadlessPeopleCounter
+from counting.replay import ReplayCapture, ReplayDetector
+from counting.scheduler import AdaptiveScheduler, DetectionInterval, MotionGate
+from .broadcast import (
+    EventHub,
+    FrameBroadcaster,
+    StreamProfile,
+    parse_last_event_id,
+    sse_messages,
+)
+from .metrics import PROMETHEUS_CONTENT_TYPE, PrometheusText
+from .multi_source import MultiSourceManager
+from .pipeline import FramePacket, FramePipeline, StageStats, broadcast_packet
+from .snapshot import SnapshotWriter, read_snapshot
+from .storage import ROLLUP_PERIODS, CrossingWriter, crossing_series
+
+# Последний JPEG-кадр для всех зрителей `video_feed`
+frame_broadcaster = FrameBroadcaster()
+# Изменения счетчика и пересечения линии для подписчиков `/api/events/`
+event_hub = EventHub()
 command_queue = queue.Queue()
 people_count = 0
 counter_instance = None
-root = None
 setup_mode = True
 stop_lock = threading.Lock()
 stopping_in_progress = False
 
 
-def create_tk_root():
-    """Создает или возвращает скрытый Tk `root` для совместимости с Tk-интерфейсом."""
-    global root
-    if root is None:
-        root = tk.Tk()
-        root.withdraw()
-    return root
+def make_detector(**overrides):
+    """Создает детектор бэкенда из настроек (`COUNTER_DETECTOR_BACKEND`)."""
+    options = {"weights": settings.COUNTER_MODEL_WEIGHTS, **settings.COUNTER_DETECTOR_OPTIONS}
+    options.update(overrides)
+    return create_detector(settings.COUNTER_DETECTOR_BACKEND, **options)
+
+
+def make_crossing_writer():
+    """Фоновая запись пересечений в базу из настроек или None, если она выключена."""
+    if settings.COUNTER_EVENT_STORE is None:
+        return None
+    return CrossingWriter(**settings.COUNTER_EVENT_STORE)
+
+
+# Запись пересечений в базу; поток запускается вместе с подсчетом
+crossing_writer = make_crossing_writer()
+
+
+def make_snapshot_writer():
+    """Периодическое сохранение состояния счетчика из настроек или None, если оно выключено."""
+    if settings.COUNTER_SNAPSHOT is None:
+        return None
+    return SnapshotWriter(**settings.COUNTER_SNAPSHOT)
+
+
+# Снимок счетчика, линии и последних событий для восстановления после перезапуска
+snapshot_writer = make_snapshot_writer()
+
+
+def make_scheduler():
+    """Планировщик детекции по движению из настроек или None, если он выключен."""
+    if settings.COUNTER_SCHEDULER is None:
+        return None
+    return AdaptiveScheduler(
+        MotionGate(**settings.COUNTER_MOTION_GATE), **settings.COUNTER_SCHEDULER
+    )
+
+
+def make_replay_source():
+    """Источник кадров и детектор для воспроизведения записи (`COUNTER_REPLAY`).
+
+    Если у записи есть детекции, модель не загружается: рамки отдает
+    `ReplayCapture.read_boxes` вместе с кадром. Иначе кадры видеофайла
+    обрабатывает обычный детектор.
+    """
+    capture = ReplayCapture(**settings.COUNTER_REPLAY)
+    detector = ReplayDetector() if capture.has_detections else make_detector()
+    return capture, detector
+
+
+# Шаги обработки кадра, задержки которых отдают `/api/stats/` и `/api/metrics/`
+FRAME_STEPS = ("capture", "flip", "inference", "tracking", "draw", "encode")
 
 
 class CounterThread(threading.Thread):
-    """Фоновый поток камерного цикла, детекции и отрисовки кадра."""
+    """Фоновый поток управления конвейером захвата, детекции и отрисовки кадра."""
 
-    def __init__(self):
+    def __init__(self, restored=None):
         super().__init__()
+        # Состояние из снимка прошлого запуска (`read_snapshot`) или None
+        self.restored = restored
         self.running = True
         self.stopped = False
         self.daemon = True
+        self.pipeline = None
+        self.frame_index = 0
+        self.scheduler = make_scheduler()
+        self.interval = DetectionInterval(**settings.COUNTER_DETECT_INTERVAL)
+        self.timings = {step: StageStats(step) for step in FRAME_STEPS}
+        # Неудачные чтения кадра с камеры
+        self.capture_failures = 0
+        # Кадры записи не зеркалятся: иначе записанные рамки не совпадут с кадром
+        self.mirror = settings.COUNTER_REPLAY is None
+        # Рамки кадров берутся из записи детекций (`ReplayCapture.read_boxes`)
+        self.replayed = False
 
     def run(self):
-        """Основной цикл: сначала режим настройки, затем режим подсчета."""
-        global root, counter_instance, setup_mode
+        """Запускает конвейер и обрабатывает команды управления до остановки."""
+        global counter_instance
         try:
-
-            class ModifiedPeopleCounter(PeopleCounter):
-                """Обертка над `PeopleCounter` c фиксацией рабочей директории и без preview."""
-
-                def __init__(self, root):
-                    current_dir = os.getcwd()
-                    os.chdir(BASE_DIR)
-                    super().__init__(root)
-                    os.chdir(current_dir)
-
-                def setup_preview(self):
-                    """Отключает внутренний preview (используется собственная выдача кадров)."""
-                    pass
-
-            # Создаем экземпляр счетчика
-            counter_instance = ModifiedPeopleCounter(create_tk_root())
-            # Сбрасываем внутренние состояния счетчика к дефолту
-            try:
-                counter_instance.people_inside = 0
-                counter_instance.previous_positions = {}
-                if hasattr(counter_instance, "line_position") and hasattr(
-                    counter_instance.line_position, "set"
-                ):
-                    counter_instance.line_position.set(50)
-                if hasattr(counter_instance, "line_angle") and hasattr(
-                    counter_instance.line_angle, "set"
-                ):
-                    counter_instance.line_angle.set(0)
-            except Exception:
-                pass
-
-            # Запускаем в режиме настройки
-            while self.running and setup_mode:
-                try:
-                    # Проверяем команды и обрабатываем кадры
-                    self._process_commands()
-                    self._process_frame(True)
-                except Exception as e:
-                    print(f"Ошибка в режиме настройки: {str(e)}")
-                    break
-
-            # Режим подсчета
-            while self.running and not setup_mode:
+            # Headless-счетчик: без Tk, настройки линии - обычные числа
+            if settings.COUNTER_REPLAY is not None:
+                capture, detector = make_replay_source()
+                self.replayed = isinstance(detector, ReplayDetector)
+                # Записанные рамки приходят с кадром и заменяют детектор, а
+                # пропуски по движению и прогноз между детекциями отключены,
+                # чтобы подсчет совпадал с записью
+                counter_instance = HeadlessPeopleCounter(
+                    detector=detector,
+                    roi=None if self.replayed else settings.COUNTER_ROI,
+                    capture=capture,
+                )
+                if self.replayed:
+                    self.scheduler = None
+                    self.interval = DetectionInterval(every=1)
+            else:
+                counter_instance = HeadlessPeopleCounter(
+                    detector=make_detector(), roi=settings.COUNTER_ROI
+                )
+            counter_instance.set_line(position=50, angle=0)
+            if self.restored:
+                counter_instance.engine.restore(self.restored)
+
+            # Захват, детекция и кодирование работают на отдельных потоках
+            # Кадры записи не вытесняются: подсчет должен совпадать с записью
+            self.pipeline = FramePipeline(
+                self._capture_frame,
+                self._infer_frame,
+                self._render_frame,
+                lossless=settings.COUNTER_REPLAY is not None,
+            )
+            self.pipeline.start()
+
+            while self.running and self.pipeline.is_alive():
                 try:
                     self._process_commands()
-                    self._process_frame(False)
                 except Exception as e:
-                    print(f"Ошибка в режиме подсчета: {str(e)}")
+                    print(f"Ошибка при обработке команд: {str(e)}")
                     break
+                self._save_snapshot()
+                time.sleep(0.01)
 
         except Exception as e:
             print(f"Критическая ошибка в потоке: {str(e)}")
@@ -110,100 +182,172 @@ class CounterThread(threading.Thread):
             while True:
                 cmd, value = command_queue.get_nowait()
                 if cmd == "position":
-                    counter_instance.line_position.set(value)
+                    counter_instance.set_line(position=value)
                 elif cmd == "angle":
-                    counter_instance.line_angle.set(value)
+                    counter_instance.set_line(angle=value)
                 command_queue.task_done()
         except queue.Empty:
             pass
 
-    def _process_frame(self, is_setup_mode):
-        """Готовит отображаемый кадр и, при необходимости, выполняет детекцию людей."""
+    def _capture_frame(self, _):
+        """Стадия захвата: читает и зеркалит кадр с камеры (или записи) без лишних копий."""
+        counter = counter_instance
+        if not counter:
+            return None
+
+        cap = counter.cap
+        if cap is None:
+            return None
+
+        # Кадр читается в свободный буфер пула и зеркалится на месте
+        ring = self.pipeline.ring
+        buffer = ring.acquire()
+        started = time.perf_counter()
+        recorded = None
+        if self.replayed:
+            ret, frame, recorded = cap.read_boxes(buffer)
+        else:
+            ret, frame = cap.read(buffer)
+        read = time.perf_counter()
+        if not ret:
+            ring.release(buffer)
+            self.capture_failures += 1
+            time.sleep(0.01)
+            return None
+
+        if self.mirror:
+            cv2.flip(frame, 1, dst=frame)
+        self.timings["capture"].record(read - started)
+        self.timings["flip"].record(time.perf_counter() - read)
+        self.frame_index += 1
+        return FramePacket(self.frame_index, frame, ring, recorded)
+
+    def _infer_frame(self, packet):
+        """Стадия инференса: в режиме подсчета детектирует людей и обновляет счетчик."""
         global people_count
 
-        if not counter_instance:
-            return
+        counter = counter_instance
+        if not counter:
+            return None
 
-        ret, frame, display_frame = counter_instance.get_optimized_frame()
-        if not ret:
-            return
+        frame = packet.frame
+        engine = counter.engine
 
-        line_start, line_end = counter_instance.get_line_points(
-            display_frame.shape[1], display_frame.shape[0]
-        )
+        if setup_mode:
+            packet.line = engine.get_line_points(frame.shape[1], frame.shape[0])
+            return packet
 
-        if is_setup_mode:
-            cv2.line(display_frame, line_start, line_end, (255, 0, 0), 2)
+        # В пустой статичной сцене модель не запускается: пустой список детекций
+        # лишь продвигает номер кадра, треков в этот момент нет
+        scheduler = self.scheduler
+        skip = scheduler is not None and not scheduler.should_detect(
+            frame, len(engine.tracker.tracks)
+        )
+        # Между детекциями треки продвигаются по прогнозу движения
+        propagate = not skip and not self.interval.should_detect()
+        boxes = []
+        if not skip and not propagate:
+            started = time.perf_counter()
+            if packet.recorded is not None:
+                boxes = packet.recorded
+            else:
+                boxes = engine.detector(frame)
+            latency = time.perf_counter() - started
+            self.interval.record(latency)
+            self.timings["inference"].record(latency)
+
+        started = time.perf_counter()
+        if propagate:
+            result = engine.propagate(frame.shape[1], frame.shape[0])
         else:
-            # Обработка режима подсчета
-            people = counter_instance.detect_people(frame)
-            cv2.line(display_frame, line_start, line_end, (255, 0, 0), 2)
-
-            current_tracks = {}
-            for i, box in enumerate(people):
-                x1, y1, x2, y2 = box
-                cv2.rectangle(display_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                foot_position = (int((x1 + x2) / 2), y2)
-                cv2.circle(display_frame, foot_position, 5, (0, 0, 255), -1)
-
-                if i in counter_instance.previous_positions:
-                    crossed, direction = counter_instance.check_line_crossing(
-                        foot_position,
-                        counter_instance.previous_positions[i],
-                        line_start,
-                        line_end,
-                    )
-                    if crossed:
-                        if direction == "in":
-                            counter_instance.people_inside += 1
-                        else:
-                            counter_instance.people_inside = max(
-                                0, counter_instance.people_inside - 1
-                            )
-
-                current_tracks[i] = foot_position
-
-            counter_instance.previous_positions = current_tracks
-            people_count = counter_instance.people_inside
-
-        # Отправляем кадр в очередь
-        _, buffer = cv2.imencode(".jpg", display_frame)
-        try:
-            frame_queue.put_nowait(buffer.tobytes())
-        except queue.Full:
-            try:
-                frame_queue.get_nowait()
-            except queue.Empty:
-                pass
-            frame_queue.put(buffer.tobytes())
+            # Треки сопоставляются по ID трекера, а не по индексу детекции в кадре
+            result = engine.update(boxes, frame.shape[1], frame.shape[0])
+        self.timings["tracking"].record(time.perf_counter() - started)
+        people_count = result.count
+        for event in result.events:
+            if crossing_writer:
+                crossing_writer.record(event, result.count)
+            event_hub.publish(
+                "crossing",
+                direction=event.direction,
+                track_id=event.track_id,
+                timestamp=event.timestamp,
+                count=result.count,
+            )
+
+        packet.apply_result(result)
+        return packet
+
+    def _render_frame(self, packet):
+        """Стадия отрисовки: рисует линию и рамки, кодирует JPEG и публикует зрителям."""
+        broadcast_packet(packet, frame_broadcaster, self.timings)
+        return None
+
+    def snapshot_state(self):
+        """Состояние для снимка: счетчик, линия, режим и последние события."""
+        counter = counter_instance
+        if not counter:
+            return None
+        return {
+            # Ложно после штатной остановки: при старте подсчет не возобновляется сам
+            "running": self.running,
+            "counting": not setup_mode,
+            **counter.engine.state(),
+            "event_sequence": event_hub.sequence,
+            "events": event_hub.recent(),
+        }
+
+    def _save_snapshot(self, force=False):
+        if not snapshot_writer:
+            return
+        state = self.snapshot_state()
+        if state is not None:
+            snapshot_writer.save(state, force=force)
+
+    def stats(self):
+        """Задержки стадий конвейера и пропуски детекции (пустой словарь без конвейера)."""
+        pipeline = self.pipeline
+        if not pipeline:
+            return {}
+        stats = pipeline.stats()
+        stats["steps"] = {step: timing.snapshot() for step, timing in self.timings.items()}
+        stats["capture_failures"] = self.capture_failures
+        if self.scheduler:
+            stats["scheduler"] = self.scheduler.stats()
+        stats["detect_interval"] = self.interval.stats()
+        return stats
 
     def cleanup(self):
-        """Освобождает ресурсы (очереди, OpenCV, Tk) и сбрасывает состояние."""
-        global counter_instance, root
+        """Освобождает ресурсы (очереди, OpenCV) и сбрасывает состояние."""
+        global counter_instance
 
         print("Начинаем очистку ресурсов...")
 
+        # Останавливаем стадии конвейера до освобождения камеры
+        if self.pipeline:
+            self.pipeline.stop()
+
+        # Итоговый снимок; при падении потока `running` остается истинным
+        try:
+            self._save_snapshot(force=True)
+        except Exception as e:
+            print(f"Ошибка при сохранении снимка: {str(e)}")
+
         # Очищаем очереди
-        self._clear_queue(frame_queue)
+        frame_broadcaster.clear()
         self._clear_queue(command_queue)
+        # Дописываем накопленные пересечения, не дожидаясь интервала пачки
+        if crossing_writer:
+            crossing_writer.flush()
 
         # Освобождаем ресурсы OpenCV
         if counter_instance:
             try:
-                counter_instance.cap.release()
+                counter_instance.release()
             except Exception:
                 pass
             counter_instance = None
 
-        # Закрываем окно Tkinter
-        if root:
-            try:
-                root.quit()
-                root.destroy()
-            except Exception:
-                pass
-            root = None
-
         print("Очистка ресурсов завершена")
 
     def stop(self):
@@ -228,15 +372,40 @@ counter_thread = None
 
 
 class StartCounterView(APIView):
-    """Стартует поток и включает режим настройки."""
+    """Стартует поток и включает режим настройки.
+
+    Счетчик и линия восстанавливаются из снимка прошлого запуска (кроме
+    запроса с `{"reset": true}`); если прошлый запуск упал во время подсчета,
+    подсчет возобновляется сразу, без режима настройки.
+    """
 
     def post(self, request):
         global counter_thread, setup_mode, people_count, counter_instance
         if counter_thread is None or not counter_thread.is_alive():
-            setup_mode = True
-            people_count = 0
-            counter_thread = CounterThread()
+            restored = None
+            if snapshot_writer and not request.data.get("reset"):
+                restored = read_snapshot(snapshot_writer.path)
+            setup_mode = not (restored and restored.get("running") and restored.get("counting"))
+            people_count = max(0, int(restored.get("people_inside", 0))) if restored else 0
+            if restored:
+                event_hub.restore(
+                    restored.get("event_sequence", 0), people_count, restored.get("events", [])
+                )
+            event_hub.publish_count(people_count)
+            if crossing_writer:
+                crossing_writer.ensure_started()
+            counter_thread = CounterThread(restored)
             counter_thread.start()
+            return Response(
+                {
+                    "status": "started",
+                    "restored": restored is not None,
+                    "count": people_count,
+                    "line_position": restored.get("line_position", 50) if restored else 50,
+                    "line_angle": restored.get("line_angle", 0) if restored else 0,
+                    "counting": not setup_mode,
+                }
+            )
         return Response({"status": "started"})
 
 
@@ -244,7 +413,7 @@ class StopCounterView(APIView):
     """Останавливает поток и безопасно освобождает ресурсы."""
 
     def post(self, request):
-        global counter_thread, counter_instance, root, stopping_in_progress
+        global counter_thread, counter_instance, stopping_in_progress
         with stop_lock:
             if stopping_in_progress:
                 return Response({"status": "stop_in_progress"}, status=429)
@@ -268,19 +437,11 @@ class StopCounterView(APIView):
                         )
                         if counter_instance:
                             try:
-                                counter_instance.cap.release()
+                                counter_instance.release()
                             except Exception:
                                 pass
                             counter_instance = None
 
-                        if root:
-                            try:
-                                root.quit()
-                                root.destroy()
-                            except Exception:
-                                pass
-                            root = None
-
                 counter_thread = None
                 print("Остановка завершена")
                 stopping_in_progress = False
@@ -291,16 +452,12 @@ class StopCounterView(APIView):
                 # Принудительная очистка всех ресурсов в случае ошибки
                 try:
                     if counter_instance:
-                        counter_instance.cap.release()
-                    if root:
-                        root.quit()
-                        root.destroy()
+                        counter_instance.release()
                 except Exception:
                     pass
 
                 counter_thread = None
                 counter_instance = None
-                root = None
                 stopping_in_progress = False
 
                 return Response(
@@ -331,35 +488,26 @@ class StartCountingView(APIView):
         return Response({"status": "counting_started"})
 
 
-def video_feed(request):
-    """Возвращает MJPEG-поток кадров для фронтенда."""
+MJPEG_PART_HEADER = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
 
-    def generate():
-        global counter_thread
-        while True:
-            if (
-                not counter_thread
-                or not counter_thread.is_alive()
-                or counter_thread.stopped
-            ):
-                print("Видеопоток остановлен")
-                break
 
-            try:
-                frame_bytes = frame_queue.get(timeout=0.5)
-                if frame_bytes:
-                    yield (
-                        b"--frame\r\n"
-                        b"Content-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n"
-                    )
-            except queue.Empty:
-                if not counter_thread or counter_thread.stopped:
-                    print("Поток остановлен, прерываем видеопоток")
-                    break
-                continue
-            except Exception as e:
-                print(f"Ошибка в видеопотоке: {str(e)}")
-                break
+def _mjpeg_response(broadcaster, is_active, profile):
+    """Отдает кадры `FrameBroadcaster` MJPEG-потоком, пока `is_active()` истинно.
+
+    Каждый зритель получает самый свежий кадр своего профиля качества
+    независимо от остальных; кадр кодируется один раз на профиль. Это вариант
+    для WSGI (поток на зрителя); под ASGI видеопотоки отдает `counter.asgi`
+    без потоков.
+    """
+
+    def generate():
+        try:
+            for frame_bytes in broadcaster.frames(is_active, profile=profile):
+                # Одна сборка части ответа прямо из буфера JPEG
+                yield b"".join((MJPEG_PART_HEADER, frame_bytes, b"\r\n"))
+        except Exception as e:
+            print(f"Ошибка в видеопотоке: {str(e)}")
+        print("Видеопоток остановлен")
 
     response = StreamingHttpResponse(
         generate(), content_type="multipart/x-mixed-replace; boundary=frame", status=200
@@ -371,8 +519,302 @@ def video_feed(request):
     return response
 
 
-class GetCountView(APIView):
+def counter_active():
+    """Истинно, пока работает поток одиночного режима."""
+    thread = counter_thread
+    return bool(thread and thread.is_alive() and not thread.stopped)
+
+
+def video_feed(request):
+    """Возвращает MJPEG-поток кадров для фронтенда.
+
+    Параметры запроса `fps`, `scale` и `quality` ограничивают частоту кадров,
+    масштабируют кадр и задают качество JPEG для этого зрителя.
+    """
+    profile = StreamProfile.from_query(request.GET)
+    return _mjpeg_response(frame_broadcaster, counter_active, profile)
+
+
+async def get_count(request):
     """Возвращает текущее значение счетчика людей."""
+    return JsonResponse({"count": people_count})
+
+
+def events_stream(request):
+    """SSE-поток изменений счетчика и пересечений линии (вариант для WSGI).
+
+    Первым сообщением приходит текущий счетчик, затем события `crossing`
+    (направление, ID трека, время, счетчик после пересечения) и `count`.
+    Под ASGI тот же поток отдает `counter.asgi` без потока на подписчика.
+    """
+    last_event_id = parse_last_event_id(request.headers.get("Last-Event-ID"))
+    response = StreamingHttpResponse(
+        sse_messages(event_hub, last_event_id), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Отключаем буферизацию в nginx, иначе события приходят пачками
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+class PipelineStatsView(APIView):
+    """Возвращает задержки стадий конвейера, заполненность очередей и время загрузки модели."""
+
+    def get(self, request):
+        thread = counter_thread
+        stats = thread.stats() if thread and thread.is_alive() else {}
+        stats["broadcast"] = frame_broadcaster.stats()
+        stats["model"] = model_timings()
+        if crossing_writer:
+            stats["event_store"] = crossing_writer.stats()
+        if snapshot_writer:
+            stats["snapshot"] = snapshot_writer.stats()
+        detector = getattr(counter_instance, "detector", None)
+        if hasattr(detector, "pixel_ratio"):
+            stats["roi_pixel_ratio"] = round(detector.pixel_ratio(), 3)
+        return Response(stats)
+
+
+def metrics(request):
+    """Метрики производительности в текстовом формате Prometheus.
+
+    Задержки шагов и стадий кадра (перцентили по скользящему окну), частота
+    кадров, глубина очередей и счетчики отброшенных кадров. Все значения
+    собираются только при опросе.
+    """
+    text = PrometheusText()
+    thread = counter_thread
+    running = bool(thread and thread.is_alive())
+    text.gauge("running", "Работает ли поток подсчета одиночного режима", running)
+    text.gauge("people_inside", "Число людей в помещении", people_count)
+
+    pipeline = thread.pipeline if running else None
+    if pipeline:
+        for step, timing in thread.timings.items():
+            text.summary(
+                "step_seconds", "Задержка шага обработки кадра, секунды", timing, {"step": step}
+            )
+        for stage in pipeline.stages:
+            labels = {"stage": stage.stats.name}
+            text.summary(
+                "stage_seconds", "Задержка стадии конвейера, секунды", stage.stats, labels
+            )
+            text.gauge("stage_fps", "Скользящая частота кадров стадии", stage.stats.fps(), labels)
+
+        queues = {"inference": pipeline.inference_queue, "render": pipeline.render_queue}
+        for name, stage_queue in queues.items():
+            text.gauge(
+                "queue_depth", "Число элементов в очереди", stage_queue.qsize(), {"queue": name}
+            )
+        dropped = {
+            "inference_queue": pipeline.inference_queue.dropped,
+            "render_queue": pipeline.render_queue.dropped,
+            "frame_ring": pipeline.ring.misses,
+            "capture": thread.capture_failures,
+        }
+        for reason, value in dropped.items():
+            text.counter(
+                "frames_dropped_total",
+                "Отброшенные кадры и промахи пула буферов",
+                value,
+                {"reason": reason},
+            )
+        if thread.scheduler:
+            text.counter(
+                "detections_skipped_total",
+                "Кадры без запуска модели",
+                thread.scheduler.skipped,
+                {"reason": "motion"},
+            )
+        text.counter(
+            "detections_skipped_total",
+            "Кадры без запуска модели",
+            thread.interval.propagated,
+            {"reason": "interval"},
+        )
+    text.gauge(
+        "queue_depth", "Число элементов в очереди", command_queue.qsize(), {"queue": "command"}
+    )
+
+    text.gauge("stream_viewers", "Зрители видеопотока", frame_broadcaster.viewers)
+    text.counter(
+        "stream_frames_skipped_total",
+        "Кадры, пропущенные медленными зрителями",
+        frame_broadcaster.skipped,
+    )
+    text.gauge("sse_subscribers", "Подписчики потока событий", event_hub.viewers)
+
+    if crossing_writer:
+        writer_stats = crossing_writer.stats()
+        text.gauge("crossings_pending", "Пересечения в очереди записи", writer_stats["pending"])
+        text.counter("crossings_written_total", "Записанные пересечения", writer_stats["written"])
+        text.counter(
+            "crossings_dropped_total", "Пересечения, не попавшие в очередь", writer_stats["dropped"]
+        )
+
+    manager = multi_manager
+    if manager:
+        text.summary(
+            "batch_inference_seconds",
+            "Задержка пакетного инференса многокамерного режима, секунды",
+            manager.server.stats,
+        )
+        for name, source in manager.sources.items():
+            text.gauge(
+                "source_people_inside", "Число людей по источнику", source.count, {"source": name}
+            )
+
+    for weights, timings in model_timings().items():
+        for phase, seconds in timings.items():
+            text.gauge(
+                "model_load_seconds",
+                "Время загрузки и прогрева модели, секунды",
+                seconds,
+                {"weights": weights, "phase": phase},
+            )
+
+    return HttpResponse(text.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# Наибольшее число интервалов в ответе `/api/history/`
+MAX_HISTORY_BUCKETS = 10000
+
+
+class CrossingHistoryView(APIView):
+    """Входы и выходы за период по минутам, часам или дням из сохраненных агрегатов.
+
+    Параметры: `start` и `end` (ISO 8601, по умолчанию последние сутки),
+    `bucket` ("minute", "hour" или "day", по умолчанию "hour") и `source`
+    (источник многокамерного режима, по умолчанию одиночный режим).
+    """
+
+    def get(self, request):
+        bucket = request.query_params.get("bucket", "hour")
+        if bucket not in (*ROLLUP_PERIODS, "day"):
+            return Response(
+                {"status": "error", "message": "bucket: minute, hour или day"}, status=400
+            )
+
+        try:
+            end = self._parse_time(request.query_params.get("end")) or timezone.now()
+            start = self._parse_time(request.query_params.get("start")) or end - timedelta(
+                days=1
+            )
+        except ValueError as e:
+            return Response({"status": "error", "message": str(e)}, status=400)
+        if start >= end:
+            return Response(
+                {"status": "error", "message": "start должен быть раньше end"}, status=400
+            )
+
+        step = ROLLUP_PERIODS.get(bucket, timedelta(days=1))
+        if (end - start) / step > MAX_HISTORY_BUCKETS:
+            return Response(
+                {"status": "error", "message": "Слишком много интервалов, увеличьте bucket"},
+                status=400,
+            )
+
+        source = request.query_params.get("source", "")
+        series = crossing_series(start, end, bucket, source)
+        return Response(
+            {
+                "source": source,
+                "bucket": bucket,
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "total": {
+                    "in": sum(entered for _, entered, _ in series),
+                    "out": sum(exited for _, _, exited in series),
+                },
+                "series": [
+                    {"start": moment.isoformat(), "in": entered, "out": exited}
+                    for moment, entered, exited in series
+                ],
+            }
+        )
+
+    @staticmethod
+    def _parse_time(value):
+        if not value:
+            return None
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(f"Некорректное время: {value}")
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+
+multi_manager = None
+multi_lock = threading.Lock()
+
+
+class StartSourcesView(APIView):
+    """Запускает многокамерный режим для источников из `COUNTER_SOURCES` или тела запроса."""
+
+    def post(self, request):
+        global multi_manager
+        with multi_lock:
+            if multi_manager and multi_manager.is_alive():
+                return Response({"status": "already_started"})
+            sources = request.data.get("sources") or settings.COUNTER_SOURCES
+            if not sources:
+                return Response({"status": "error", "message": "Нет источников"}, status=400)
+            if crossing_writer:
+                crossing_writer.ensure_started()
+            multi_manager = MultiSourceManager(
+                sources, make_detector(max_det=50), crossing_writer
+            )
+            multi_manager.start()
+        return Response({"status": "started", "sources": list(multi_manager.sources)})
+
+
+class StopSourcesView(APIView):
+    """Останавливает многокамерный режим."""
+
+    def post(self, request):
+        global multi_manager
+        with multi_lock:
+            if not multi_manager:
+                return Response({"status": "already_stopped"}, status=400)
+            multi_manager.stop()
+            multi_manager = None
+            if crossing_writer:
+                crossing_writer.flush()
+        return Response({"status": "stopped"})
+
+
+class SourcesStatsView(APIView):
+    """Пропускная способность многокамерного режима по источникам и ядрам CPU."""
 
     def get(self, request):
-        return Response({"count": people_count})
+        manager = multi_manager
+        if not manager:
+            return Response({"status": "stopped"})
+        return Response(manager.stats())
+
+
+async def source_count(request, source):
+    """Возвращает счетчик людей для одного источника."""
+    manager = multi_manager
+    camera = manager.get(source) if manager else None
+    if camera is None:
+        return JsonResponse({"status": "not_found"}, status=404)
+    return JsonResponse({"source": source, "count": camera.count})
+
+
+def source_stream(source):
+    """`(broadcaster, is_active)` источника многокамерного режима или None."""
+    manager = multi_manager
+    camera = manager.get(source) if manager else None
+    if camera is None:
+        return None
+    return camera.broadcaster, manager.is_alive
+
+
+def source_video_feed(request, source):
+    """MJPEG-поток кадров одного источника многокамерного режима."""
+    stream = source_stream(source)
+    if stream is None:
+        return JsonResponse({"status": "not_found"}, status=404)
+    return _mjpeg_response(*stream, StreamProfile.from_query(request.GET))
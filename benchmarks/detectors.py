@@ -0,0 +1,105 @@
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from counting.detector import create_detector
+
+
+def load_frames(video_path, frames, stride=1):
+    """Читает кадры ролика в память, чтобы все бэкенды получили одинаковый вход."""
+    cap = cv2.VideoCapture(video_path)
+    result = []
+    index = 0
+    while len(result) < frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index % stride == 0:
+            result.append(frame)
+        index += 1
+    cap.release()
+    return result
+
+
+def benchmark_detector(detector, frames, batch_size=1, warmup=3):
+    """Замеряет задержку на кадр и число детекций для одного детектора."""
+    detector.warm_up(frames[0].shape[1], frames[0].shape[0], runs=warmup)
+
+    latencies = []
+    detections = []
+    for start in range(0, len(frames), batch_size):
+        batch = frames[start : start + batch_size]
+        started = time.perf_counter()
+        boxes = detector.detect_batch(batch)
+        elapsed = time.perf_counter() - started
+        latencies.extend([elapsed / len(batch)] * len(batch))
+        detections.extend(len(frame_boxes) for frame_boxes in boxes)
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "frames": len(frames),
+        "batch_size": batch_size,
+        "mean_ms": round(float(latencies.mean()), 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "fps": round(1000 / float(latencies.mean()), 2),
+        "detections": detections,
+    }
+
+
+def parse_model(spec):
+    """`бэкенд:путь[@imgsz]`, например `onnxruntime:yolov8n-int8.onnx@416`."""
+    backend, _, rest = spec.partition(":")
+    weights, _, imgsz = rest.partition("@")
+    options = {"weights": weights}
+    if imgsz and backend != "ultralytics":
+        options["imgsz"] = int(imgsz)
+    return backend, options
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Сравнение бэкендов детектора на одном и том же ролике"
+    )
+    parser.add_argument("video", help="ролик для замера")
+    parser.add_argument(
+        "--model",
+        action="append",
+        required=True,
+        help="бэкенд:путь[@imgsz], можно указать несколько раз",
+    )
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--stride", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=None, help="потоков инференса")
+    args = parser.parse_args(argv)
+
+    frames = load_frames(args.video, args.frames, args.stride)
+    if not frames:
+        parser.error(f"Не удалось прочитать кадры из {args.video}")
+
+    if args.threads:
+        # Потоки OpenCV (и OpenCV DNN) задаются на весь процесс, а не в детекторе
+        cv2.setNumThreads(args.threads)
+    reference = None
+    for spec in args.model:
+        backend, options = parse_model(spec)
+        if args.threads and backend != "ultralytics":
+            options["threads"] = args.threads
+        stats = benchmark_detector(create_detector(backend, **options), frames, args.batch_size)
+        detections = stats.pop("detections")
+        # Доля кадров, где число людей совпало с первым (эталонным) бэкендом
+        if reference is None:
+            reference = detections
+        stats["count_agreement"] = round(
+            float(np.mean(np.array(detections) == np.array(reference))), 3
+        )
+        stats["total_detections"] = int(sum(detections))
+        print(json.dumps({"model": spec, **stats}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.append(BACKEND_DIR)
+
+from counter.broadcast import DEFAULT_PROFILE  # noqa: E402
+from counter.pipeline import FramePacket, FrameRing, draw_packet  # noqa: E402
+
+MJPEG_PART_HEADER = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+
+
+class SyntheticCapture:
+    """Источник кадров с интерфейсом `cv2.VideoCapture.read` без камеры и файла.
+
+    Как и настоящий захват, пишет кадр в переданный буфер, если он подходит
+    по размеру, и выделяет новый массив в противном случае.
+    """
+
+    def __init__(self, width=480, height=360, frames=16, seed=0):
+        rng = np.random.default_rng(seed)
+        self.frames = [
+            rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(frames)
+        ]
+        self.index = 0
+
+    def read(self, image=None):
+        frame = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        if image is None or image.shape != frame.shape:
+            return True, frame.copy()
+        np.copyto(image, frame)
+        return True, image
+
+
+class LoopedVideo:
+    """Ролик, который при достижении конца начинается заново."""
+
+    def __init__(self, path):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"Не удалось открыть видео: {path}")
+
+    def read(self, image=None):
+        ret, frame = self.cap.read(image)
+        if not ret:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read(image)
+        return ret, frame
+
+
+def _annotate(packet, width, height):
+    packet.line = ((0, height // 2), (width, height // 2))
+    packet.boxes = [[40, 60, 120, 300], [260, 80, 330, 320]]
+    packet.tracks = {0: (80, 300), 1: (295, 320)}
+
+
+def legacy_path(cap, index):
+    """Прежний путь кадра: новый массив на каждом шаге и копия JPEG в `bytes`."""
+    _, frame = cap.read()
+    frame = cv2.flip(frame, 1)
+    packet = FramePacket(index, frame.copy())
+    _annotate(packet, frame.shape[1], frame.shape[0])
+    display_frame = packet.frame
+    cv2.line(display_frame, *packet.line, (255, 0, 0), 2)
+    for x1, y1, x2, y2 in packet.boxes:
+        cv2.rectangle(display_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+    for foot_position in packet.tracks.values():
+        cv2.circle(display_frame, foot_position, 5, (0, 0, 255), -1)
+    _, buffer = cv2.imencode(".jpg", display_frame)
+    return MJPEG_PART_HEADER + buffer.tobytes() + b"\r\n"
+
+
+def ring_path(cap, index, ring):
+    """Текущий путь кадра: буфер из пула, зеркалирование на месте, JPEG через memoryview.
+
+    Отрисовка и кодирование - те же, что у сервера в `broadcast_packet`
+    (`draw_packet` и `StreamProfile.encode` с профилем по умолчанию).
+    """
+    buffer = ring.acquire()
+    _, frame = cap.read(buffer)
+    cv2.flip(frame, 1, dst=frame)
+    packet = FramePacket(index, frame, ring)
+    _annotate(packet, frame.shape[1], frame.shape[0])
+    jpeg = DEFAULT_PROFILE.encode(draw_packet(packet))
+    packet.release()
+    return b"".join((MJPEG_PART_HEADER, jpeg, b"\r\n"))
+
+
+def measure(step, frames, frame_bytes, warmup=10):
+    """Средняя задержка шага и пиковый объем памяти, выделенной за один кадр.
+
+    Задержка и память замеряются в разных проходах: tracemalloc заметно
+    замедляет выполнение. Пик над исходным уровнем, деленный на размер
+    кадра, показывает, сколько кадровых буферов одновременно создает шаг.
+    """
+    for index in range(warmup):
+        step(index)
+
+    started = time.perf_counter()
+    for index in range(frames):
+        step(index)
+    elapsed = time.perf_counter() - started
+
+    peaks = []
+    tracemalloc.start()
+    for index in range(frames):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        step(index)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    tracemalloc.stop()
+
+    peak = float(np.mean(peaks))
+    return {
+        "mean_ms": round(elapsed / frames * 1000, 3),
+        "fps": round(frames / elapsed, 1),
+        "allocated_kb_per_frame": round(peak / 1024, 1),
+        "frame_buffers_per_frame": round(peak / frame_bytes, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Выделения памяти и задержка пути кадра: захват, зеркалирование, отрисовка, JPEG"
+    )
+    parser.add_argument("--video", help="ролик вместо синтетических кадров")
+    parser.add_argument("--width", type=int, default=480)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args(argv)
+
+    def open_capture():
+        if args.video:
+            return LoopedVideo(args.video)
+        return SyntheticCapture(args.width, args.height)
+
+    _, first = open_capture().read()
+    frame_bytes = first.nbytes
+    ring = FrameRing(size=4)
+    paths = {
+        "legacy": lambda cap: lambda index: legacy_path(cap, index),
+        "ring": lambda cap: lambda index: ring_path(cap, index, ring),
+    }
+    for name, make_step in paths.items():
+        cap = open_capture()
+        step = make_step(cap)
+        stats = measure(step, args.frames, frame_bytes)
+        if name == "ring":
+            stats["ring_misses"] = ring.misses
+        print(json.dumps({"path": name, **stats}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from counting.detector import Detector
+from counting.engine import CountingEngine
+from counting.replay import load_detections
+from counting.tracker import PeopleTracker
+
+PEOPLE = (1, 10, 50, 200)
+
+
+def synthetic_stream(people, frames, width=640, height=480, seed=0):
+    """Детекции людей, идущих вверх и вниз через середину кадра.
+
+    Каждый человек движется с постоянной скоростью и небольшим дрожанием
+    рамки; вышедший за край кадра появляется с противоположной стороны уже
+    как новый трек. С одинаковым `seed` поток детекций воспроизводится точно.
+    """
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(20, width - 60, people)
+    y = rng.uniform(0, height, people)
+    speed = rng.uniform(2, 8, people) * rng.choice([-1, 1], people)
+    box_w = rng.integers(30, 60, people)
+    box_h = rng.integers(80, 160, people)
+
+    stream = []
+    for _ in range(frames):
+        jitter = rng.integers(-2, 3, (people, 2))
+        foot_x = (x + jitter[:, 0]).astype(int)
+        foot_y = (y + jitter[:, 1]).astype(int)
+        boxes = np.stack(
+            [foot_x - box_w // 2, foot_y - box_h, foot_x + box_w // 2, foot_y], axis=1
+        )
+        stream.append(boxes.tolist())
+        y = (y + speed) % height
+    return stream
+
+
+class StubDetector(Detector):
+    """Детектор, возвращающий заранее подготовленные рамки по очереди."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.index = 0
+
+    def detect(self, frame):
+        boxes = self.stream[self.index % len(self.stream)]
+        self.index += 1
+        return boxes
+
+
+def measure(step, frames, warmup=10):
+    """Задержка шага по кадрам и пиковая память, выделенная за кадр.
+
+    Как и в `benchmarks.frame_path`, задержка и память замеряются в разных
+    проходах: tracemalloc заметно замедляет выполнение.
+    """
+    for index in range(warmup):
+        step(index)
+
+    latencies = np.empty(frames)
+    for index in range(frames):
+        started = time.perf_counter()
+        step(index)
+        latencies[index] = time.perf_counter() - started
+
+    peaks = []
+    tracemalloc.start()
+    for index in range(frames):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        step(index)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    tracemalloc.stop()
+
+    latencies *= 1000
+    mean = float(latencies.mean())
+    return {
+        "mean_ms": round(mean, 4),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+        "fps": round(1000 / mean, 1) if mean else 0.0,
+        "allocated_kb_per_frame": round(float(np.mean(peaks)) / 1024, 2),
+    }
+
+
+def crossing_pairs(stream):
+    """Пары (точка ног, точка на прошлом кадре) по порядку рамок соседних кадров."""
+    pairs = []
+    for previous, current in zip(stream, stream[1:] + stream[:1]):
+        pairs.append(
+            [
+                (PeopleTracker.foot_position(box), PeopleTracker.foot_position(prev))
+                for box, prev in zip(current, previous)
+            ]
+        )
+    return pairs
+
+
+def hot_path_steps(stream, width, height):
+    """Шаги горячего пути: имя -> фабрика функции `step(index)` на свежем состоянии."""
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    pairs = crossing_pairs(stream)
+
+    def check_line_crossing():
+        engine = CountingEngine()
+        line_start, line_end = engine.get_line_points(width, height)
+
+        def step(index):
+            for position, previous in pairs[index % len(pairs)]:
+                engine.check_line_crossing(position, previous, line_start, line_end)
+
+        return step
+
+    def tracker_update():
+        tracker = PeopleTracker()
+        return lambda index: tracker.update(stream[index % len(stream)])
+
+    def get_line_points():
+        engine = CountingEngine()
+        return lambda index: engine.get_line_points(width, height)
+
+    def engine_update():
+        engine = CountingEngine()
+        return lambda index: engine.update(stream[index % len(stream)], width, height)
+
+    def process_frame():
+        engine = CountingEngine(detector=StubDetector(stream))
+        return lambda index: engine.process_frame(frame)
+
+    return {
+        "check_line_crossing": check_line_crossing,
+        "tracker_update": tracker_update,
+        "get_line_points": get_line_points,
+        "engine_update": engine_update,
+        "process_frame": process_frame,
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms=0.05):
+    """Шаги, у которых средняя задержка выросла больше чем на `tolerance` от эталона.
+
+    Рост меньше `min_delta_ms` не считается регрессией: у шагов в единицы
+    микросекунд относительный шум замера велик.
+    """
+    reference = {(row["people"], row["step"]): row for row in baseline}
+    regressions = []
+    for row in results:
+        base = reference.get((row["people"], row["step"]))
+        if not base:
+            continue
+        delta = row["mean_ms"] - base["mean_ms"]
+        if delta > base["mean_ms"] * tolerance and delta > min_delta_ms:
+            regressions.append(
+                {
+                    "people": row["people"],
+                    "step": row["step"],
+                    "mean_ms": row["mean_ms"],
+                    "baseline_ms": base["mean_ms"],
+                }
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Задержка, частота и выделения памяти горячего пути подсчета без GPU"
+    )
+    parser.add_argument(
+        "--people", type=int, nargs="+", default=list(PEOPLE), help="людей в кадре"
+    )
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--recorded", help="записанные детекции (.npz, см. counting.replay) вместо синтетики"
+    )
+    parser.add_argument("--save", help="сохранить результаты как эталон (JSON)")
+    parser.add_argument("--baseline", help="эталон для сравнения; при регрессии код выхода 1")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="допустимый рост средней задержки"
+    )
+    parser.add_argument(
+        "--min-delta-ms", type=float, default=0.05, help="меньший рост задержки не считается"
+    )
+    args = parser.parse_args(argv)
+
+    if args.recorded:
+        streams = {"recorded": load_detections(args.recorded)[0]}
+    else:
+        streams = {
+            people: synthetic_stream(people, args.frames, args.width, args.height, args.seed)
+            for people in args.people
+        }
+
+    results = []
+    for people, stream in streams.items():
+        for name, make_step in hot_path_steps(stream, args.width, args.height).items():
+            row = {"people": people, "step": name, **measure(make_step(), args.frames)}
+            results.append(row)
+            print(json.dumps(row, ensure_ascii=False))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(json.dumps({"regression": regression}, ensure_ascii=False))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
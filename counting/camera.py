@@ -0,0 +1,33 @@
+import cv2
+
+
+def open_camera(index=0, width=480, height=360):
+    """Открывает камеру с минимальным буфером и пониженным разрешением."""
+    # На Windows ускоряет открытие: CAP_DSHOW
+    try:
+        cap = cv2.VideoCapture(index, cv2.CAP_DSHOW)
+        if not cap or not cap.isOpened():
+            cap = cv2.VideoCapture(index)
+    except Exception:
+        cap = cv2.VideoCapture(index)
+    # Уменьшаем задержки буфера
+    try:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    except Exception:
+        pass
+    # Устанавливаем пониженное разрешение камеры для лучшей производительности
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    return cap
+
+
+def open_source(source, width=480, height=360):
+    """Открывает источник кадров: индекс камеры, RTSP/HTTP-поток или видеофайл."""
+    if isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+        return open_camera(int(source), width, height)
+    cap = cv2.VideoCapture(source)
+    try:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    except Exception:
+        pass
+    return cap
@@ -0,0 +1,313 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Кадров в одном файле кэша
+CHUNK_FRAMES = 1024
+# Размер кэша по умолчанию, байт
+DEFAULT_MAX_BYTES = 2 * 1024**3
+# Параметры детектора, от которых зависят рамки
+KEY_ATTRIBUTES = ("weights", "imgsz", "conf", "iou", "max_det", "min_size")
+# Сколько байт с начала и с конца файла участвует в отпечатке
+FINGERPRINT_SAMPLE = 1024**2
+# Вытеснение освобождает место с запасом, чтобы каталог не обходился после
+# каждой записи блока в заполненный кэш
+EVICT_TO = 0.9
+# Блокировка блока старше этого срока считается брошенной упавшим процессом, с
+LOCK_STALE_AFTER = 30.0
+
+
+def file_fingerprint(path):
+    """Отпечаток файла по размеру и первому и последнему мегабайту содержимого.
+
+    Не зависит от имени и времени изменения, поэтому копия записи попадает в
+    тот же кэш, а перезаписанный файл - нет. Файл целиком не читается.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(FINGERPRINT_SAMPLE))
+        if size > FINGERPRINT_SAMPLE:
+            f.seek(max(FINGERPRINT_SAMPLE, size - FINGERPRINT_SAMPLE))
+            digest.update(f.read(FINGERPRINT_SAMPLE))
+    return digest.hexdigest()[:20]
+
+
+def detector_key(detector, **extra):
+    """Ключ детектора: класс, модель и пороги (`KEY_ATTRIBUTES`) и `extra`.
+
+    Если веса - локальный файл, в ключ входит и его отпечаток: после
+    переобучения модели с тем же именем файла старые рамки не используются.
+    """
+    params = {"class": type(detector).__name__, **extra}
+    for name in KEY_ATTRIBUTES:
+        if hasattr(detector, name):
+            params[name] = getattr(detector, name)
+    weights = params.get("weights")
+    if isinstance(weights, str) and os.path.isfile(weights):
+        params["weights_fingerprint"] = file_fingerprint(weights)
+    data = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode()).hexdigest()[:16]
+
+
+@contextmanager
+def _file_lock(path, timeout=60.0):
+    """Межпроцессная блокировка через создание файла `path + ".lock"` (O_EXCL).
+
+    Работает одинаково в Linux и Windows и не требует fcntl; блокировка,
+    брошенная упавшим процессом, снимается через `LOCK_STALE_AFTER` секунд.
+    """
+    lock_path = path + ".lock"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > LOCK_STALE_AFTER:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Блок кэша занят другим процессом: {path}")
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+def _write_chunk(path, data):
+    """Атомарно записывает файл кэша: временный файл и `os.replace`."""
+    fd, tmp_path = tempfile.mkstemp(prefix=".chunk-", suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class DetectionCache:
+    """Дисковый кэш рамок по кадрам с вытеснением давно не использованных файлов.
+
+    Раскладка: `<directory>/<отпечаток видео>/<ключ детектора>/<номер блока>.npy`.
+    Блок хранит `CHUNK_FRAMES` кадров одним массивом int32: сначала число рамок
+    каждого кадра (-1 - кадр еще не детектировался), затем рамки подряд. Блоки
+    открываются через `np.load(mmap_mode="r")` и читаются с диска по мере
+    обращения. Когда кэш превышает `max_bytes`, удаляются блоки с самым
+    старым временем последнего использования до `EVICT_TO` от `max_bytes`.
+    Каталог обходится при первой записи и когда оценка размера кэша
+    (начальный размер плюс записанное этим процессом) превысит `max_bytes`.
+
+    Объект передается в процессы `counting.sharded`, и они могут работать с
+    одним каталогом одновременно: блок перезаписывается под межпроцессной
+    блокировкой с перечитыванием его с диска, поэтому рамки, записанные
+    другим процессом в тот же блок, не теряются.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, chunk_frames=CHUNK_FRAMES):
+        self.directory = os.fspath(directory)
+        self.max_bytes = max_bytes
+        self.chunk_frames = chunk_frames
+        # Оценка размера кэша в байтах (None - каталог еще не обходился)
+        self.size_estimate = None
+
+    def open(self, video_path, key):
+        """Кэш рамок видеофайла `video_path` для детектора с ключом `key`."""
+        return CachedVideo(self, file_fingerprint(video_path), key)
+
+    def record_write(self, delta):
+        """Учитывает изменение размера после записи блока и при переполнении вытесняет."""
+        if self.size_estimate is None:
+            self.evict()
+        else:
+            self.size_estimate += delta
+            if self.size_estimate > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """Удаляет давно не использованные блоки, если кэш больше `max_bytes`."""
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".npy"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        removed = 0
+        target = self.max_bytes * EVICT_TO if total > self.max_bytes else total
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self.size_estimate = total
+        return removed
+
+
+class CachedVideo:
+    """Рамки кадров одного видеофайла и детектора; создается `DetectionCache.open`.
+
+    Новые рамки копятся в памяти и пишутся на диск целым блоком при переходе
+    к другому блоку и в `close`.
+    """
+
+    def __init__(self, cache, fingerprint, key):
+        self.cache = cache
+        self.video_dir = os.path.join(cache.directory, fingerprint)
+        self.directory = os.path.join(self.video_dir, key)
+        os.makedirs(self.directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        # Открытый блок: номер, массив на диске, смещения рамок кадров
+        self._chunk = None
+        self._data = None
+        self._offsets = None
+        # Номер блока -> {кадр в блоке: рамки}, еще не записанные на диск
+        self._pending = {}
+
+    def _path(self, chunk):
+        return os.path.join(self.directory, f"{chunk:08d}.npy")
+
+    def _load(self, chunk):
+        if self._chunk == chunk:
+            return self._data is not None
+        self._chunk = chunk
+        self._data = None
+        path = self._path(chunk)
+        try:
+            data = np.load(path, mmap_mode="r")
+            # Время изменения - метка последнего использования для вытеснения
+            os.utime(path)
+        except (OSError, ValueError):
+            return False
+        counts = np.asarray(data[: self.cache.chunk_frames])
+        self._data = data
+        self._offsets = self.cache.chunk_frames + 4 * np.concatenate(
+            [[0], np.cumsum(np.maximum(counts, 0))]
+        )
+        return True
+
+    def _lookup(self, index):
+        chunk, slot = divmod(index, self.cache.chunk_frames)
+        pending = self._pending.get(chunk)
+        if pending is not None and slot in pending:
+            return pending[slot]
+        if not self._load(chunk) or self._data[slot] < 0:
+            return None
+        start, end = self._offsets[slot], self._offsets[slot + 1]
+        return np.asarray(self._data[start:end]).reshape(-1, 4).tolist()
+
+    def get(self, index):
+        """Рамки кадра `index` или None, если кадра нет в кэше."""
+        boxes = self._lookup(index)
+        if boxes is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return boxes
+
+    def put(self, index, boxes):
+        chunk, slot = divmod(index, self.cache.chunk_frames)
+        for other in [other for other in self._pending if other != chunk]:
+            self._flush(other)
+        self._pending.setdefault(chunk, {})[slot] = boxes
+
+    def covers(self, start, end, step=1):
+        """Есть ли на диске рамки всех кадров `range(start, end, step)`."""
+        frames = self.cache.chunk_frames
+        indices = np.arange(start, end, step)
+        for chunk in np.unique(indices // frames):
+            slots = indices[indices // frames == chunk] % frames
+            if not self._load(int(chunk)) or (self._data[slots] < 0).any():
+                return False
+        return True
+
+    def _flush(self, chunk):
+        pending = self._pending.pop(chunk, None)
+        if not pending:
+            return
+        path = self._path(chunk)
+        frames = self.cache.chunk_frames
+        with _file_lock(path):
+            counts = np.full(frames, -1, dtype=np.int32)
+            boxes = [None] * frames
+            # Блок перечитывается с диска под блокировкой: рамки, записанные
+            # раньше, в том числе другим процессом, сохраняются
+            self._chunk = None
+            try:
+                previous_size = os.path.getsize(path)
+            except OSError:
+                previous_size = 0
+            if self._load(chunk):
+                counts[:] = self._data[:frames]
+                for slot in np.flatnonzero(counts >= 0):
+                    start, end = self._offsets[slot], self._offsets[slot + 1]
+                    boxes[slot] = np.array(self._data[start:end])
+            for slot, frame_boxes in pending.items():
+                counts[slot] = len(frame_boxes)
+                boxes[slot] = np.asarray(frame_boxes, dtype=np.int32).reshape(-1)
+            data = np.concatenate(
+                [counts] + [frame_boxes for frame_boxes in boxes if frame_boxes is not None]
+            ).astype(np.int32)
+            self._chunk = None
+            self._data = None
+            _write_chunk(path, data)
+            size = os.path.getsize(path)
+        self.writes += 1
+        self.cache.record_write(size - previous_size)
+
+    def _info_path(self):
+        return os.path.join(self.video_dir, "video.json")
+
+    @property
+    def frame_count(self):
+        """Число кадров видео, если запись уже дочитывалась до конца, иначе None."""
+        try:
+            with open(self._info_path(), encoding="utf-8") as f:
+                return json.load(f)["frames"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set_frame_count(self, frames):
+        fd, tmp_path = tempfile.mkstemp(prefix=".video-", suffix=".tmp", dir=self.video_dir)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"frames": frames}, f)
+        os.replace(tmp_path, self._info_path())
+
+    def close(self):
+        """Записывает накопленные рамки на диск."""
+        for chunk in list(self._pending):
+            self._flush(chunk)
+        self._chunk = None
+        self._data = None
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "writes": self.writes}
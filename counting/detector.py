@@ -0,0 +1,152 @@
+import threading
+import time
+
+import numpy as np
+
+# Реестр моделей процесса: веса загружаются один раз и переиспользуются всеми
+# детекторами (между циклами старт/стоп и между источниками)
+_models = {}
+_model_locks = {}
+_timings = {}
+_registry_lock = threading.Lock()
+
+
+def get_model(weights="yolov8n.pt"):
+    """Возвращает загруженную модель YOLO, загружая ее при первом обращении."""
+    with _registry_lock:
+        model = _models.get(weights)
+        if model is None:
+            started = time.perf_counter()
+            from ultralytics import YOLO
+
+            model = YOLO(weights)
+            _models[weights] = model
+            _model_locks[weights] = threading.Lock()
+            record_timing(weights, "load_s", time.perf_counter() - started)
+        return model
+
+
+def model_lock(weights):
+    """Блокировка инференса модели: предиктор Ultralytics не потокобезопасен."""
+    get_model(weights)
+    return _model_locks[weights]
+
+
+def record_timing(weights, name, seconds):
+    """Сохраняет время загрузки/прогрева модели для `model_timings`."""
+    _timings.setdefault(weights, {})[name] = round(seconds, 3)
+
+
+def model_timings():
+    """Время загрузки и прогрева по каждым загруженным весам, в секундах."""
+    return {weights: dict(timings) for weights, timings in _timings.items()}
+
+
+class Detector:
+    """Интерфейс детектора людей: кадр BGR → список рамок `[x1, y1, x2, y2]`."""
+
+    weights = None
+
+    def load(self):
+        """Загружает модель заранее (по умолчанию - при первом кадре)."""
+        return None
+
+    def detect(self, frame):
+        raise NotImplementedError
+
+    def detect_batch(self, frames):
+        """Детектирует людей на нескольких кадрах; по умолчанию - по одному кадру."""
+        return [self.detect(frame) for frame in frames]
+
+    def __call__(self, frame):
+        return self.detect(frame)
+
+    def warm_up(self, width=480, height=360, runs=2):
+        """Загружает модель и прогоняет пустые кадры, чтобы первый реальный кадр не ждал.
+
+        Первые вызовы инициализируют граф и выделяют буферы, поэтому без
+        прогрева первый кадр подсчета обрабатывается секунды.
+        """
+        self.load()
+        dummy = np.zeros((height, width, 3), dtype=np.uint8)
+        started = time.perf_counter()
+        for _ in range(runs):
+            self.detect(dummy)
+        record_timing(self.weights, "warmup_s", time.perf_counter() - started)
+        return self
+
+
+def warm_up(weights="yolov8n.pt", width=480, height=360, runs=2):
+    """Загружает и прогревает модель Ultralytics с указанными весами."""
+    return PeopleDetector(weights=weights).warm_up(width, height, runs)
+
+
+def create_detector(backend="ultralytics", **options):
+    """Создает детектор выбранного бэкенда: `ultralytics`, `onnxruntime` или `opencv`."""
+    if backend == "ultralytics":
+        return PeopleDetector(**options)
+    if backend in ("onnxruntime", "opencv"):
+        from .onnx_detector import OnnxPeopleDetector, OpenCVPeopleDetector
+
+        cls = OnnxPeopleDetector if backend == "onnxruntime" else OpenCVPeopleDetector
+        return cls(**options)
+    raise ValueError(f"Неизвестный бэкенд детектора: {backend}")
+
+
+class PeopleDetector(Detector):
+    """Детектор людей на базе YOLOv8.
+
+    Модель берется из реестра процесса (`get_model`), поэтому новый детектор не
+    перезагружает веса. Ultralytics импортируется только при первой загрузке.
+    """
+
+    def __init__(self, weights="yolov8n.pt", conf=0.35, iou=0.3, max_det=10, min_size=30):
+        self.weights = weights
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        # Минимальный размер рамки в пикселях
+        self.min_size = min_size
+        self.model = None
+
+    def load(self):
+        if self.model is None:
+            self.model = get_model(self.weights)
+        return self.model
+
+    def _predict(self, source):
+        # Запускаем YOLO для обнаружения только класса 'person' (индекс 0)
+        # Уменьшаем порог NMS для лучшего разделения близко стоящих людей
+        model = self.load()
+        with model_lock(self.weights):
+            return model(
+                source,
+                classes=0,
+                conf=self.conf,
+                iou=self.iou,
+                max_det=self.max_det,
+                verbose=False,
+            )
+
+    def _boxes(self, result):
+        boxes = []
+        for box in result.boxes:
+            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+
+            # Фильтруем по размеру рамки, чтобы исключить слишком маленькие детекции
+            if x2 - x1 > self.min_size and y2 - y1 > self.min_size:
+                boxes.append([int(x1), int(y1), int(x2), int(y2)])
+        return boxes
+
+    def detect(self, frame):
+        """Возвращает список `[x1, y1, x2, y2]` детекций класса person на кадре."""
+        boxes = []
+        for result in self._predict(frame):
+            boxes.extend(self._boxes(result))
+        return boxes
+
+    def detect_batch(self, frames):
+        """Детектирует людей на нескольких кадрах за один прямой проход модели."""
+        if not frames:
+            return []
+        return [self._boxes(result) for result in self._predict(list(frames))]
@@ -0,0 +1,308 @@
+import math
+import time
+
+import numpy as np
+
+from .tracker import PeopleTracker
+
+
+class CrossingEvent:
+    """Факт пересечения линии подсчета конкретным треком."""
+
+    __slots__ = ("track_id", "direction", "position", "frame_index", "timestamp")
+
+    def __init__(self, track_id, direction, position, frame_index, timestamp):
+        self.track_id = track_id
+        self.direction = direction
+        self.position = position
+        self.frame_index = frame_index
+        self.timestamp = timestamp
+
+    def as_dict(self):
+        return {
+            "track_id": self.track_id,
+            "direction": self.direction,
+            "position": list(self.position),
+            "frame_index": self.frame_index,
+            "timestamp": self.timestamp,
+        }
+
+
+class FrameResult:
+    """Результат обработки одного кадра: линия, треки, события и текущий счетчик."""
+
+    __slots__ = ("frame_index", "line", "tracks", "events", "count")
+
+    def __init__(self, frame_index, line, tracks, events, count):
+        self.frame_index = frame_index
+        self.line = line
+        # Список `(track_id, box, position, previous_position)`
+        self.tracks = tracks
+        self.events = events
+        self.count = count
+
+
+class LineModel:
+    """Закэшированная геометрия линии подсчета для конкретного кадра.
+
+    Сторона точки относительно линии задается как `a*x + b*y + c`; это то же
+    векторное произведение, что и в `point_position_relative_to_line`, но с
+    заранее посчитанными коэффициентами, поэтому для всех точек кадра оно
+    вычисляется одним умножением матрицы на вектор.
+    """
+
+    __slots__ = ("key", "start", "end", "normal", "offset", "in_sign")
+
+    def __init__(self, key, start, end, angle):
+        self.key = key
+        self.start = start
+        self.end = end
+        (x1, y1), (x2, y2) = start, end
+        self.normal = np.array([y1 - y2, x2 - x1], dtype=np.float64)
+        self.offset = float((y2 - y1) * x1 - (x2 - x1) * y1)
+        # Для углов 0-179 движение с положительной стороны считается входом,
+        # для 180-359 - наоборот
+        self.in_sign = 1 if 0 <= angle < 180 else -1
+
+    def sides(self, points):
+        """Знаковые расстояния (без нормировки) для массива точек формы `(..., 2)`."""
+        return np.asarray(points, dtype=np.float64) @ self.normal + self.offset
+
+    def direction(self, prev_side):
+        return "in" if prev_side * self.in_sign > 0 else "out"
+
+
+class CountingEngine:
+    """Ядро подсчета без GUI: детекции кадра → треки, пересечения линии, счетчик.
+
+    Используется и Tk-приложением, и Django-бэкендом, поэтому логика трекинга и
+    подсчета существует в одном экземпляре. Настройки линии хранятся как обычные
+    числа: положение в процентах (0-100) и угол в градусах (0-359).
+    """
+
+    def __init__(self, detector=None, tracker=None, line_position=50, line_angle=0):
+        # Необязательная функция `frame -> [[x1, y1, x2, y2], ...]` для `process_frame`
+        self.detector = detector
+        self.tracker = tracker or PeopleTracker()
+        self.line_position = line_position
+        self.line_angle = line_angle
+        self.people_inside = 0
+        self.frame_index = 0
+        self._line_model = None
+        # ID трека -> пересечение по прогнозу, ждущее подтверждения детекцией
+        self._pending = {}
+
+    def reset(self, people_inside=0):
+        """Сбрасывает счетчик и треки (настройки линии сохраняются)."""
+        self.people_inside = people_inside
+        self.frame_index = 0
+        self.tracker.reset()
+        self._pending = {}
+
+    def set_line(self, position=None, angle=None):
+        if position is not None:
+            self.line_position = float(position)
+        if angle is not None:
+            self.line_angle = float(angle)
+
+    def state(self):
+        """Счетчик и настройки линии в виде словаря для сохранения на диск."""
+        return {
+            "people_inside": self.people_inside,
+            "line_position": self.line_position,
+            "line_angle": self.line_angle,
+        }
+
+    def restore(self, state):
+        """Восстанавливает счетчик и линию из `state()`; треки начинаются заново."""
+        self.set_line(state.get("line_position"), state.get("line_angle"))
+        self.reset(max(0, int(state.get("people_inside", 0))))
+
+    def line_model(self, frame_width, frame_height):
+        """Возвращает `LineModel`, пересчитывая его только при изменении линии или кадра."""
+        key = (self.line_position, self.line_angle, frame_width, frame_height)
+        model = self._line_model
+        if model is None or model.key != key:
+            start, end = self._compute_line_points(*key)
+            model = LineModel(key, start, end, key[1])
+            self._line_model = model
+        return model
+
+    def get_line_points(self, frame_width, frame_height):
+        """Вычисляет координаты начала и конца линии подсчета с учетом соотношения сторон кадра"""
+        model = self.line_model(frame_width, frame_height)
+        return model.start, model.end
+
+    @staticmethod
+    def _compute_line_points(line_position, line_angle, frame_width, frame_height):
+        """Геометрия линии по положению (0-100) и углу (градусы) для кадра заданного размера."""
+        # Центр кадра
+        center_x = frame_width // 2
+        center_y = frame_height // 2
+
+        # Получаем угол и переводим в радианы
+        angle_rad = math.radians(line_angle)
+
+        # Вычисляем коэффициент масштабирования смещения в зависимости от угла
+        # При 0° и 180° (горизонтальная линия) используем высоту кадра
+        # При 90° и 270° (вертикальная линия) используем ширину кадра
+        # Между ними - плавный переход
+        vertical_factor = abs(math.sin(angle_rad))
+        horizontal_factor = abs(math.cos(angle_rad))
+
+        # Вычисляем смещение с учетом угла наклона
+        base_offset = (line_position - 50) / 50.0  # От -1 до 1
+        offset_x = base_offset * frame_width * vertical_factor
+        offset_y = base_offset * frame_height * horizontal_factor
+
+        # Используем длину, гарантирующую пересечение кадра при любом угле
+        line_length = math.sqrt(frame_width**2 + frame_height**2) * 1.5
+        half_length = line_length / 2
+
+        # Вычисляем базовые точки линии
+        x1 = center_x + half_length * math.cos(angle_rad)
+        y1 = center_y + half_length * math.sin(angle_rad)
+        x2 = center_x - half_length * math.cos(angle_rad)
+        y2 = center_y - half_length * math.sin(angle_rad)
+
+        # Применяем смещение в зависимости от угла
+        x1 += offset_x
+        x2 += offset_x
+        y1 += offset_y
+        y2 += offset_y
+
+        return (int(x1), int(y1)), (int(x2), int(y2))
+
+    @staticmethod
+    def point_position_relative_to_line(point, line_start, line_end):
+        """Определяет, с какой стороны от линии находится точка
+
+        Использует векторное произведение для определения положения точки:
+        - Если результат > 0, точка находится с одной стороны линии
+        - Если результат < 0, точка находится с другой стороны
+        - Если результат = 0, точка лежит на линии
+        """
+        x, y = point
+        x1, y1 = line_start
+        x2, y2 = line_end
+
+        # (x2-x1)(y-y1) - (y2-y1)(x-x1)
+        return (x2 - x1) * (y - y1) - (y2 - y1) * (x - x1)
+
+    def check_line_crossing(self, current_pos, previous_pos, line_start, line_end):
+        """Проверяет факт пересечения линии и определяет направление (in/out)."""
+        # Если нет предыдущей позиции, пересечения быть не может
+        if previous_pos is None:
+            return False, None
+
+        prev_side = self.point_position_relative_to_line(
+            previous_pos, line_start, line_end
+        )
+        curr_side = self.point_position_relative_to_line(
+            current_pos, line_start, line_end
+        )
+
+        # Если знаки разные (произведение < 0), значит линия была пересечена
+        if (prev_side * curr_side) < 0:
+            # Для углов 0-179 градусов:
+            #   - если prev_side > 0, человек двигается внутрь
+            #   - если prev_side < 0, человек двигается наружу
+            # Для углов 180-359 градусов - наоборот
+            if 0 <= self.line_angle < 180:
+                return True, "in" if prev_side > 0 else "out"
+            else:
+                return True, "in" if prev_side < 0 else "out"
+
+        return False, None
+
+    def update(self, boxes, frame_width, frame_height, frame_index=None, timestamp=None):
+        """Обновляет треки и счетчик по детекциям кадра и возвращает `FrameResult`.
+
+        `frame_index` и `timestamp` передаются при обработке записей, где номер
+        кадра и время берутся из видео, а не из внутреннего счетчика и часов.
+        """
+        return self._advance(
+            self.tracker.update(boxes), frame_width, frame_height, frame_index, timestamp
+        )
+
+    def propagate(self, frame_width, frame_height, frame_index=None, timestamp=None):
+        """Продвигает треки по прогнозу движения на кадре без детекции.
+
+        Пересечение линии по прогнозу не засчитывается сразу: оно ждет
+        следующей детекции трека. Если человек действительно оказался по
+        другую сторону линии, засчитывается событие с кадром и временем
+        прогнозного пересечения, иначе оно отбрасывается. Так момент
+        пересечения не смещается к детекции, а остановившийся перед линией
+        человек не дает пары ложных событий.
+        """
+        return self._advance(
+            self.tracker.predict(),
+            frame_width,
+            frame_height,
+            frame_index,
+            timestamp,
+            predicted=True,
+        )
+
+    def _count(self, event):
+        if event.direction == "in":
+            self.people_inside += 1
+        else:
+            self.people_inside = max(0, self.people_inside - 1)
+
+    def _advance(
+        self, tracks, frame_width, frame_height, frame_index, timestamp, predicted=False
+    ):
+        if frame_index is not None:
+            self.frame_index = frame_index
+        model = self.line_model(frame_width, frame_height)
+
+        events = []
+        moved = [track for track in tracks if track[3] is not None]
+        if moved:
+            # Стороны текущей и предыдущей точки для всех треков одним проходом
+            points = np.array(
+                [(position, previous) for _, _, position, previous in moved],
+                dtype=np.float64,
+            )
+            sides = model.sides(points)
+            crossed = np.flatnonzero(sides[:, 0] * sides[:, 1] < 0)
+
+            if timestamp is None:
+                timestamp = time.time()
+            for k in crossed:
+                track_id, _, position, _ = moved[k]
+                direction = model.direction(sides[k, 1])
+                event = CrossingEvent(
+                    track_id, direction, position, self.frame_index, timestamp
+                )
+                if predicted:
+                    # Прогноз линеен и пересекает линию не больше одного раза
+                    self._pending[track_id] = event
+                    continue
+                # Предыдущая точка детекции - последняя обнаруженная позиция
+                # трека, поэтому такое пересечение подтверждено двумя детекциями
+                pending = self._pending.pop(track_id, None)
+                if pending is not None and pending.direction == direction:
+                    event = pending
+                self._count(event)
+                events.append(event)
+
+        if not predicted and self._pending:
+            # Прогнозные пересечения, не подтвержденные детекцией трека на этом
+            # кадре, и пересечения удаленных треков отбрасываются
+            detected = {track[0] for track in tracks}
+            for track_id in list(self._pending):
+                if track_id in detected or track_id not in self.tracker.tracks:
+                    del self._pending[track_id]
+
+        result = FrameResult(
+            self.frame_index, (model.start, model.end), tracks, events, self.people_inside
+        )
+        self.frame_index += 1
+        return result
+
+    def process_frame(self, frame):
+        """Детектирует людей на кадре заданным детектором и обновляет подсчет."""
+        boxes = self.detector(frame)
+        return self.update(boxes, frame.shape[1], frame.shape[0])
@@ -0,0 +1,120 @@
+import argparse
+import os
+
+import cv2
+
+from .onnx_detector import _normalize_size, letterbox
+
+
+def export_onnx(weights="yolov8n.pt", imgsz=640, dynamic=True, opset=12):
+    """Экспортирует веса Ultralytics в ONNX и возвращает путь к файлу."""
+    from ultralytics import YOLO
+
+    return YOLO(weights).export(
+        format="onnx", imgsz=imgsz, dynamic=dynamic, simplify=True, opset=opset
+    )
+
+
+def convert_fp16(source, target):
+    """Переводит веса модели в FP16, оставляя вход и выход в FP32."""
+    import onnx
+    from onnxconverter_common import float16
+
+    model = float16.convert_float_to_float16(onnx.load(source), keep_io_types=True)
+    onnx.save(model, target)
+    return target
+
+
+class _VideoCalibrationReader:
+    """Источник калибровочных кадров для статической INT8-квантизации."""
+
+    def __init__(self, input_name, video_path, imgsz, frames):
+        self.input_name = input_name
+        self.blobs = []
+        cap = cv2.VideoCapture(video_path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or frames
+        step = max(1, total // frames)
+        index = 0
+        while len(self.blobs) < frames:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ret, frame = cap.read()
+            if not ret:
+                break
+            canvas, _, _ = letterbox(frame, imgsz)
+            self.blobs.append(cv2.dnn.blobFromImage(canvas, 1 / 255.0, swapRB=True))
+            index += step
+        cap.release()
+        self._iterator = iter(self.blobs)
+
+    def get_next(self):
+        blob = next(self._iterator, None)
+        return None if blob is None else {self.input_name: blob}
+
+
+def quantize_int8(source, target, calibration_video=None, imgsz=640, frames=64):
+    """Квантизует модель в INT8.
+
+    С калибровочным видео выполняется статическая квантизация (QDQ, по
+    каналам) - она заметно ускоряет свертки на CPU; без него - динамическая
+    квантизация весов.
+    """
+    from onnxruntime.quantization import (
+        QuantFormat,
+        QuantType,
+        quantize_dynamic,
+        quantize_static,
+    )
+
+    if calibration_video is None:
+        quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+        return target
+
+    import onnxruntime as ort
+
+    input_name = ort.InferenceSession(source).get_inputs()[0].name
+    reader = _VideoCalibrationReader(
+        input_name, calibration_video, _normalize_size(imgsz), frames
+    )
+    quantize_static(
+        source,
+        target,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+    return target
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Экспорт YOLOv8 в ONNX (FP32/FP16/INT8)")
+    parser.add_argument("--weights", default="yolov8n.pt", help="веса Ultralytics")
+    parser.add_argument("--onnx", help="готовая ONNX-модель вместо экспорта")
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[640], help="размер входа")
+    parser.add_argument("--static", action="store_true", help="экспорт со статическим входом")
+    parser.add_argument("--fp16", action="store_true", help="сохранить FP16-вариант")
+    parser.add_argument("--int8", action="store_true", help="сохранить INT8-вариант")
+    parser.add_argument("--calibration", help="видео для статической INT8-квантизации")
+    parser.add_argument("--calibration-frames", type=int, default=64)
+    args = parser.parse_args(argv)
+
+    imgsz = args.imgsz[0] if len(args.imgsz) == 1 else args.imgsz
+    source = args.onnx or export_onnx(args.weights, imgsz, dynamic=not args.static)
+    base, _ = os.path.splitext(source)
+    print(f"FP32: {source}")
+    if args.fp16:
+        print(f"FP16: {convert_fp16(source, base + '-fp16.onnx')}")
+    if args.int8:
+        target = quantize_int8(
+            source,
+            base + "-int8.onnx",
+            args.calibration,
+            imgsz,
+            args.calibration_frames,
+        )
+        print(f"INT8: {target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from .camera import open_camera
+from .detector import PeopleDetector
+from .engine import CountingEngine
+from .roi import RoiDetector
+
+
+class HeadlessPeopleCounter:
+    """Счетчик людей без Tkinter для серверного режима.
+
+    Положение и угол линии хранятся в `CountingEngine` как обычные числа, поэтому
+    покадровый цикл не обращается к Tcl и может работать из любого потока и на
+    серверах без дисплея. Если передан `roi` (параметры `RoiDetector`),
+    детектор обрабатывает только полосу вокруг линии подсчета. Вместо камеры
+    можно передать готовый источник кадров `capture` (например, `ReplayCapture`).
+    """
+
+    def __init__(self, camera_index=0, detector=None, roi=None, capture=None):
+        self.detector = detector or PeopleDetector()
+        self.engine = CountingEngine()
+        if roi is not None:
+            self.detector = RoiDetector(self.detector, self.engine.get_line_points, **roi)
+        self.engine.detector = self.detector
+        self.cap = capture if capture is not None else open_camera(camera_index)
+
+    @property
+    def people_inside(self):
+        return self.engine.people_inside
+
+    def set_line(self, position=None, angle=None):
+        """Атомарно обновляет настройки линии подсчета."""
+        self.engine.set_line(position=position, angle=angle)
+
+    def get_line_points(self, frame_width, frame_height):
+        return self.engine.get_line_points(frame_width, frame_height)
+
+    def detect_people(self, frame):
+        return self.detector(frame)
+
+    def release(self):
+        """Освобождает камеру."""
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
@@ -0,0 +1,422 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+import cv2
+
+from .detection_cache import DEFAULT_MAX_BYTES, DetectionCache, detector_key
+from .detector import PeopleDetector, create_detector
+from .engine import CountingEngine
+from .replay import save_detections
+from .roi import RoiDetector
+from .tracker import PeopleTracker
+from .trajectories import TrajectoryRecorder
+
+
+class OfflineResult:
+    """Итог обработки записи: события пересечения, счетчик и скорость обработки."""
+
+    def __init__(
+        self,
+        events,
+        count,
+        frames_read,
+        frames_processed,
+        elapsed,
+        video_fps,
+        cache=None,
+        trajectories=None,
+    ):
+        self.events = events
+        self.count = count
+        self.frames_read = frames_read
+        self.frames_processed = frames_processed
+        self.elapsed = elapsed
+        self.video_fps = video_fps
+        # Статистика кэша детекций или None, если он не использовался
+        self.cache = cache
+        # `Trajectories` обработанных кадров, если их запись была включена
+        self.trajectories = trajectories
+
+    @property
+    def processing_fps(self):
+        return self.frames_read / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def realtime_factor(self):
+        """Во сколько раз обработка быстрее воспроизведения записи."""
+        return self.processing_fps / self.video_fps if self.video_fps else 0.0
+
+    def summary(self):
+        summary = {
+            "count": self.count,
+            "events": len(self.events),
+            "frames_read": self.frames_read,
+            "frames_processed": self.frames_processed,
+            "elapsed_s": round(self.elapsed, 2),
+            "processing_fps": round(self.processing_fps, 2),
+            "realtime_factor": round(self.realtime_factor, 2),
+        }
+        if self.cache is not None:
+            summary["cache"] = self.cache
+        return summary
+
+
+def _draw_result(frame, result):
+    line_start, line_end = result.line
+    cv2.line(frame, line_start, line_end, (255, 0, 0), 2)
+    for _, (x1, y1, x2, y2), foot_position, _ in result.tracks:
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.circle(frame, foot_position, 5, (0, 0, 255), -1)
+    cv2.putText(
+        frame,
+        f"Inside: {result.count}",
+        (10, 30),
+        cv2.FONT_HERSHEY_SIMPLEX,
+        1.0,
+        (0, 0, 255),
+        2,
+    )
+
+
+def _open_writer(output_path, fps, width, height):
+    # Для .mp4 используем mp4v, для остальных контейнеров - XVID
+    codec = "mp4v" if output_path.lower().endswith(".mp4") else "XVID"
+    return cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*codec), fps, (width, height))
+
+
+def _read_batch(cap, batch_size, stride, frame_index, end_frame):
+    """Читает до `batch_size` кадров с шагом `stride`, пропуская кадры через `grab()`.
+
+    Возвращает список `(frame_index, frame)`, номер следующего кадра и число
+    прочитанных из файла кадров.
+    """
+    batch = []
+    frames_read = 0
+    while len(batch) < batch_size:
+        if end_frame is not None and frame_index >= end_frame:
+            break
+        if frame_index % stride:
+            # Пропускаемые кадры не декодируются
+            if not cap.grab():
+                break
+        else:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            batch.append((frame_index, frame))
+        frame_index += 1
+        frames_read += 1
+    return batch, frame_index, frames_read
+
+
+def _index_batch(batch_size, stride, frame_index, end_frame):
+    """Как `_read_batch`, но без чтения файла: кадры - None (все рамки есть в кэше)."""
+    end = min(end_frame, frame_index + batch_size * stride)
+    indices = [index for index in range(frame_index, end) if index % stride == 0]
+    # Начало после известного конца записи: кадров нет
+    return [(index, None) for index in indices], end, max(0, end - frame_index)
+
+
+def _detect_cached(detector, cached, batch):
+    """Рамки кадров пакета: из кэша, а отсутствующие - детектором с записью в кэш."""
+    detections = [cached.get(index) for index, _ in batch]
+    missing = [i for i, boxes in enumerate(detections) if boxes is None]
+    if missing:
+        found = detector.detect_batch([batch[i][1] for i in missing])
+        for i, boxes in zip(missing, found):
+            detections[i] = boxes
+            cached.put(batch[i][0], boxes)
+    return detections
+
+
+def count_video(
+    input_path,
+    output_path=None,
+    detector=None,
+    line_position=50,
+    line_angle=0,
+    stride=1,
+    batch_size=8,
+    start_frame=0,
+    end_frame=None,
+    max_distance=100,
+    roi=None,
+    detections_path=None,
+    cache=None,
+    tracks_path=None,
+    record_tracks=False,
+):
+    """Прогоняет детекцию, трекинг и проверку пересечений по видеофайлу.
+
+    Детекция выполняется пакетами по `batch_size` кадров, обрабатывается каждый
+    `stride`-й кадр. Время событий - секунды от начала записи. Если задан
+    `output_path`, обработанные кадры с разметкой записываются в видеофайл.
+    `roi` - параметры `RoiDetector` для детекции только у линии подсчета.
+    Если задан `detections_path`, рамки обработанных кадров сохраняются в
+    .npz для воспроизведения без модели (`counting.replay`).
+
+    `cache` (`DetectionCache`) хранит рамки между запусками: при повторном
+    подсчете той же записи с другой линией модель запускается только на
+    кадрах, которых нет в кэше, а если есть все, видео не декодируется.
+
+    Траектории треков (`counting.trajectories`) собираются при
+    `record_tracks` или `tracks_path` (тогда и сохраняются в .npz) и
+    позволяют пересчитать входы и выходы для другой линии без трекинга.
+    """
+    detector = detector or PeopleDetector()
+    stride = max(1, int(stride))
+    # При прореживании кадров человек успевает сместиться дальше
+    engine = CountingEngine(
+        tracker=PeopleTracker(max_distance=max_distance * stride),
+        line_position=line_position,
+        line_angle=line_angle,
+    )
+    cached = None
+    if cache is not None:
+        # Рамки детекции по ROI зависят от положения линии
+        extra = {"roi": roi, "line": [line_position, line_angle]} if roi is not None else {}
+        cached = cache.open(input_path, detector_key(detector, **extra))
+    if roi is not None:
+        detector = RoiDetector(detector, engine.get_line_points, **roi)
+
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise IOError(f"Не удалось открыть видео: {input_path}")
+
+    video_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+    out = None
+    if output_path:
+        out = _open_writer(output_path, video_fps / stride, width, height)
+
+    # Кадры нужны только модели и разметке; без них хватает номеров кадров
+    skip_decode = False
+    if cached is not None and out is None:
+        last_frame = cached.frame_count
+        if end_frame is not None:
+            last_frame = end_frame if last_frame is None else min(end_frame, last_frame)
+        first = start_frame + (-start_frame) % stride
+        skip_decode = last_frame is not None and cached.covers(first, last_frame, stride)
+
+    events = []
+    recorded = [] if detections_path else None
+    tracks = TrajectoryRecorder() if record_tracks or tracks_path else None
+    frames_read = 0
+    frames_processed = 0
+    frame_index = start_frame
+    started = time.perf_counter()
+    try:
+        while True:
+            if skip_decode:
+                batch, frame_index, read = _index_batch(
+                    batch_size, stride, frame_index, last_frame
+                )
+            else:
+                batch, frame_index, read = _read_batch(
+                    cap, batch_size, stride, frame_index, end_frame
+                )
+            frames_read += read
+            if not batch:
+                if cached is not None and not skip_decode:
+                    if end_frame is None or frame_index < end_frame:
+                        # Запись дочитана до конца: число кадров известно
+                        cached.set_frame_count(frame_index)
+                break
+
+            if cached is not None:
+                detections = _detect_cached(detector, cached, batch)
+            else:
+                detections = detector.detect_batch([frame for _, frame in batch])
+            for (index, frame), boxes in zip(batch, detections):
+                result = engine.update(
+                    boxes,
+                    width,
+                    height,
+                    frame_index=index,
+                    timestamp=index / video_fps,
+                )
+                events.extend(result.events)
+                if recorded is not None:
+                    recorded.append(boxes)
+                if tracks is not None:
+                    tracks.add(result)
+                if out is not None:
+                    _draw_result(frame, result)
+                    out.write(frame)
+            frames_processed += len(batch)
+    finally:
+        cap.release()
+        if out is not None:
+            out.release()
+        if cached is not None:
+            cached.close()
+
+    if recorded is not None:
+        save_detections(
+            detections_path,
+            recorded,
+            video_fps / stride,
+            width,
+            height,
+            # Первый обработанный кадр: номера кадров кратны шагу
+            start_frame=start_frame + (-start_frame) % stride,
+            stride=stride,
+        )
+    trajectories = None
+    if tracks is not None:
+        trajectories = tracks.trajectories(video_fps, width, height)
+        if tracks_path:
+            trajectories.save(tracks_path)
+
+    return OfflineResult(
+        events,
+        engine.people_inside,
+        frames_read,
+        frames_processed,
+        time.perf_counter() - started,
+        video_fps,
+        cached.stats() if cached is not None else None,
+        trajectories,
+    )
+
+
+def write_events(events, path):
+    """Сохраняет события пересечения в JSON или CSV (по расширению файла)."""
+    rows = [event.as_dict() for event in events]
+    if path.lower().endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame_index", "timestamp", "track_id", "direction", "x", "y"])
+            for row in rows:
+                x, y = row["position"]
+                writer.writerow(
+                    [
+                        row["frame_index"],
+                        round(row["timestamp"], 3),
+                        row["track_id"],
+                        row["direction"],
+                        x,
+                        y,
+                    ]
+                )
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Офлайн-подсчет людей по видеозаписи")
+    parser.add_argument("input", help="путь к видеофайлу")
+    parser.add_argument("--output", help="путь для видео с разметкой")
+    parser.add_argument("--events", help="файл событий пересечения (.json или .csv)")
+    parser.add_argument(
+        "--save-detections", help="сохранить рамки кадров в .npz для counting.replay"
+    )
+    parser.add_argument("--line-position", type=float, default=50, help="положение линии, 0-100")
+    parser.add_argument("--line-angle", type=float, default=0, help="угол линии, градусы")
+    parser.add_argument("--stride", type=int, default=1, help="обрабатывать каждый N-й кадр")
+    parser.add_argument("--batch-size", type=int, default=8, help="кадров в одном проходе модели")
+    parser.add_argument("--start-frame", type=int, default=0)
+    parser.add_argument("--end-frame", type=int, default=None)
+    parser.add_argument(
+        "--backend",
+        default="ultralytics",
+        choices=["ultralytics", "onnxruntime", "opencv"],
+        help="бэкенд детектора",
+    )
+    parser.add_argument("--weights", default="yolov8n.pt", help="веса YOLO (.pt или .onnx)")
+    parser.add_argument("--imgsz", type=int, default=None, help="размер входа ONNX-модели")
+    parser.add_argument("--threads", type=int, default=None, help="потоков инференса ONNX")
+    parser.add_argument("--conf", type=float, default=0.35, help="порог уверенности")
+    parser.add_argument("--max-det", type=int, default=50, help="максимум детекций на кадр")
+    parser.add_argument(
+        "--save-tracks", help="сохранить траектории треков в .npz для counting.trajectories"
+    )
+    parser.add_argument(
+        "--cache-dir", help="каталог кэша детекций для повторных прогонов той же записи"
+    )
+    parser.add_argument(
+        "--cache-size", type=int, default=DEFAULT_MAX_BYTES // 1024**2, help="размер кэша, МБ"
+    )
+    parser.add_argument(
+        "--roi-band",
+        type=float,
+        default=None,
+        help="детектировать только в полосе ±доля высоты кадра вокруг линии",
+    )
+    parser.add_argument(
+        "--roi-head-room",
+        type=float,
+        default=0.35,
+        help="запас над полосой под рост человека, доля высоты кадра",
+    )
+    return parser
+
+
+def detector_options(args):
+    """Параметры `create_detector` из аргументов командной строки."""
+    options = {
+        "backend": args.backend,
+        "weights": args.weights,
+        "conf": args.conf,
+        "max_det": args.max_det,
+    }
+    if args.backend != "ultralytics":
+        if args.imgsz:
+            options["imgsz"] = args.imgsz
+        if args.threads:
+            options["threads"] = args.threads
+    return options
+
+
+def roi_options(args):
+    """Параметры `RoiDetector` из аргументов командной строки или None."""
+    if args.roi_band is None:
+        return None
+    return {"band": args.roi_band, "head_room": args.roi_head_room}
+
+
+def cache_options(args):
+    """`DetectionCache` из аргументов командной строки или None."""
+    if not args.cache_dir:
+        return None
+    return DetectionCache(args.cache_dir, max_bytes=args.cache_size * 1024**2)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.threads and args.backend == "opencv":
+        # Потоки OpenCV DNN задаются на весь процесс, а не в детекторе
+        cv2.setNumThreads(args.threads)
+    detector = create_detector(**detector_options(args))
+    result = count_video(
+        args.input,
+        output_path=args.output,
+        detector=detector,
+        line_position=args.line_position,
+        line_angle=args.line_angle,
+        stride=args.stride,
+        batch_size=args.batch_size,
+        start_frame=args.start_frame,
+        end_frame=args.end_frame,
+        roi=roi_options(args),
+        detections_path=args.save_detections,
+        cache=cache_options(args),
+        tracks_path=args.save_tracks,
+    )
+    if args.events:
+        write_events(result.events, args.events)
+    summary = {"input": os.path.basename(args.input), **result.summary()}
+    print(json.dumps(summary, ensure_ascii=False))
+    return result
+
+
+if __name__ == "__main__":
+    main()
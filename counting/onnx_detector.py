@@ -0,0 +1,218 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from .detector import Detector, record_timing
+
+# Сессии ONNX Runtime и сети OpenCV DNN кэшируются на процесс так же, как
+# модели Ultralytics
+_sessions = {}
+_sessions_lock = threading.Lock()
+# Путь к весам -> (cv2.dnn.Net, блокировка прямого прохода этой сети)
+_nets = {}
+
+
+def letterbox(frame, size):
+    """Вписывает кадр в `size=(h, w)` с сохранением пропорций и серыми полями.
+
+    Возвращает подготовленный кадр, коэффициент масштаба и смещение `(left, top)`.
+    """
+    height, width = frame.shape[:2]
+    ratio = min(size[0] / height, size[1] / width)
+    new_height, new_width = round(height * ratio), round(width * ratio)
+    top = (size[0] - new_height) // 2
+    left = (size[1] - new_width) // 2
+
+    canvas = np.full((size[0], size[1], 3), 114, dtype=np.uint8)
+    canvas[top : top + new_height, left : left + new_width] = cv2.resize(
+        frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR
+    )
+    return canvas, ratio, (left, top)
+
+
+def _normalize_size(imgsz):
+    if isinstance(imgsz, int):
+        return (imgsz, imgsz)
+    return tuple(int(v) for v in imgsz)
+
+
+class YoloOnnxDetector(Detector):
+    """Общая часть детекторов по экспортированной в ONNX модели YOLOv8.
+
+    Предобработка (letterbox, нормализация) и постобработка (фильтр класса
+    person, NMS OpenCV) выполняются вне Ultralytics; наследники реализуют
+    только прямой проход `_forward(blob)`.
+    """
+
+    def __init__(
+        self,
+        weights="yolov8n.onnx",
+        imgsz=640,
+        conf=0.35,
+        iou=0.3,
+        max_det=10,
+        min_size=30,
+        threads=None,
+    ):
+        self.weights = weights
+        self.imgsz = _normalize_size(imgsz)
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.min_size = min_size
+        self.threads = threads or os.cpu_count() or 1
+
+    def _forward(self, blob):
+        raise NotImplementedError
+
+    def _prepare(self, frames):
+        prepared = [letterbox(frame, self.imgsz) for frame in frames]
+        blob = cv2.dnn.blobFromImages(
+            [canvas for canvas, _, _ in prepared], 1 / 255.0, swapRB=True
+        )
+        return blob, [(ratio, pad) for _, ratio, pad in prepared]
+
+    def _postprocess(self, prediction, ratio, pad):
+        # Выход YOLOv8: (4 + число классов, число якорей); класс person - строка 4
+        scores = prediction[4]
+        keep = scores > self.conf
+        if not keep.any():
+            return []
+
+        scores = scores[keep]
+        cx, cy, w, h = prediction[:4, keep]
+        left, top = pad
+        x1 = (cx - w / 2 - left) / ratio
+        y1 = (cy - h / 2 - top) / ratio
+        widths = w / ratio
+        heights = h / ratio
+
+        rects = np.stack([x1, y1, widths, heights], axis=1)
+        indices = cv2.dnn.NMSBoxes(
+            rects.tolist(), scores.tolist(), self.conf, self.iou, top_k=self.max_det
+        )
+
+        boxes = []
+        for i in np.asarray(indices).reshape(-1)[: self.max_det]:
+            x, y, bw, bh = rects[i]
+            # Фильтруем по размеру рамки, чтобы исключить слишком маленькие детекции
+            if bw > self.min_size and bh > self.min_size:
+                boxes.append([int(x), int(y), int(x + bw), int(y + bh)])
+        return boxes
+
+    def detect(self, frame):
+        """Возвращает список `[x1, y1, x2, y2]` детекций класса person на кадре."""
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames):
+        if not len(frames):
+            return []
+        blob, transforms = self._prepare(frames)
+        output = self._forward(blob)
+        return [
+            self._postprocess(prediction, ratio, pad)
+            for prediction, (ratio, pad) in zip(output, transforms)
+        ]
+
+
+class OnnxPeopleDetector(YoloOnnxDetector):
+    """Детектор на ONNX Runtime (CPU или OpenVINO) для FP32/FP16/INT8-моделей.
+
+    Если модель экспортирована со статическим размером входа, он берется из
+    модели; с динамическим - используется `imgsz`. Статический батч 1
+    обрабатывается покадрово.
+    """
+
+    def __init__(self, weights="yolov8n.onnx", providers=None, **options):
+        super().__init__(weights=weights, **options)
+        self.providers = providers or ["CPUExecutionProvider"]
+        self.session = None
+        self.input_name = None
+        self.static_batch = False
+
+    def load(self):
+        if self.session is not None:
+            return self.session
+
+        key = (self.weights, self.threads, tuple(self.providers))
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                import onnxruntime as ort
+
+                started = time.perf_counter()
+                session_options = ort.SessionOptions()
+                session_options.intra_op_num_threads = self.threads
+                session_options.graph_optimization_level = (
+                    ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                )
+                session = ort.InferenceSession(
+                    self.weights, sess_options=session_options, providers=self.providers
+                )
+                _sessions[key] = session
+                record_timing(self.weights, "load_s", time.perf_counter() - started)
+
+        model_input = session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, height, width = model_input.shape
+        if isinstance(height, int) and isinstance(width, int):
+            self.imgsz = (height, width)
+        self.static_batch = isinstance(batch, int)
+        self.session = session
+        return session
+
+    def _forward(self, blob):
+        session = self.load()
+        if self.static_batch and blob.shape[0] > 1:
+            outputs = [
+                session.run(None, {self.input_name: blob[i : i + 1]})[0]
+                for i in range(len(blob))
+            ]
+            return np.concatenate(outputs)
+        return session.run(None, {self.input_name: blob})[0]
+
+    def _prepare(self, frames):
+        # Размер входа может быть уточнен по модели при загрузке
+        self.load()
+        return super()._prepare(frames)
+
+
+class OpenCVPeopleDetector(YoloOnnxDetector):
+    """Детектор на OpenCV DNN: не требует ни PyTorch, ни ONNX Runtime.
+
+    Сеть одна на процесс для каждого файла весов. Число потоков OpenCV
+    общее для всего процесса (в том числе для отражения, масштабирования и
+    кодирования кадров), поэтому детектор его не меняет: `threads` задает
+    запускающий процесс через `cv2.setNumThreads` (`counting.offline`,
+    `benchmarks.detectors`, backend при старте).
+    """
+
+    def __init__(self, weights="yolov8n.onnx", **options):
+        super().__init__(weights=weights, **options)
+        self.net = None
+        self._lock = None
+
+    def load(self):
+        if self.net is not None:
+            return self.net
+
+        with _sessions_lock:
+            entry = _nets.get(self.weights)
+            if entry is None:
+                started = time.perf_counter()
+                # cv2.dnn.Net хранит вход в себе, поэтому прямой проход общей
+                # сети сериализуется общей блокировкой
+                entry = (cv2.dnn.readNetFromONNX(self.weights), threading.Lock())
+                _nets[self.weights] = entry
+                record_timing(self.weights, "load_s", time.perf_counter() - started)
+        self.net, self._lock = entry
+        return self.net
+
+    def _forward(self, blob):
+        net = self.load()
+        with self._lock:
+            net.setInput(blob)
+            return net.forward()
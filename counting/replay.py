@@ -0,0 +1,298 @@
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from .detector import Detector
+from .engine import CountingEngine
+from .tracker import PeopleTracker
+
+
+def load_detections(path):
+    """Читает записанные детекции из .npz.
+
+    Формат: `boxes` (N, 4) - рамки всех кадров подряд, `counts` - число рамок
+    в каждом кадре; необязательные `fps`, `width`, `height` - параметры
+    записи, `start_frame` и `stride` - номер кадра видео первой строки и шаг
+    между строками. Возвращает список рамок по кадрам и словарь параметров.
+    """
+    with np.load(path) as data:
+        boxes = data["boxes"].astype(int).reshape(-1, 4)
+        counts = data["counts"].astype(int)
+        meta = {
+            key: float(data[key]) if key == "fps" else int(data[key])
+            for key in ("fps", "width", "height", "start_frame", "stride")
+            if key in data.files
+        }
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    stream = [boxes[start:end].tolist() for start, end in zip(offsets[:-1], offsets[1:])]
+    return stream, meta
+
+
+def save_detections(path, stream, fps=30.0, width=None, height=None, start_frame=0, stride=1):
+    """Сохраняет рамки по кадрам в компактный .npz (формат `load_detections`).
+
+    `fps` - частота строк записи; строка i - кадр видео `start_frame + i * stride`.
+    """
+    boxes = [box for frame_boxes in stream for box in frame_boxes]
+    data = {
+        "boxes": np.asarray(boxes, dtype=np.int32).reshape(-1, 4),
+        "counts": np.asarray([len(frame_boxes) for frame_boxes in stream], dtype=np.int32),
+        "fps": np.float32(fps),
+        "start_frame": np.int32(start_frame),
+        "stride": np.int32(stride),
+    }
+    if width and height:
+        data["width"] = np.int32(width)
+        data["height"] = np.int32(height)
+    np.savez_compressed(path, **data)
+
+
+def target_fps(speed, source_fps):
+    """Частота выдачи кадров по `speed`; None - без ограничения.
+
+    `speed`: "realtime" (частота записи), "max" (как можно быстрее), "4x"
+    (кратно частоте записи) или число кадров в секунду.
+    """
+    if speed in (None, "max"):
+        return None
+    if speed == "realtime":
+        return source_fps
+    if isinstance(speed, str) and speed.endswith("x"):
+        return source_fps * float(speed[:-1])
+    return float(speed)
+
+
+def is_detections_file(path):
+    """Запись детекций (.npz), а не видеофайл."""
+    return str(path).lower().endswith(".npz")
+
+
+def replays_detections(path, detections=None, **_):
+    """Берет ли `ReplayCapture` с такими параметрами рамки из записи (модель не нужна)."""
+    return detections is not None or is_detections_file(path)
+
+
+class ReplayCapture:
+    """Источник кадров из видеофайла или записанных детекций с заданной скоростью.
+
+    Повторяет интерфейс `cv2.VideoCapture` (`read`, `get`, `isOpened`,
+    `release`), поэтому подставляется вместо камеры в любой цикл подсчета.
+    Если `path` - .npz с детекциями, кадры - однотонные заглушки размера
+    записи; детекции видеофайла можно передать отдельно в `detections`.
+    Тогда выдаются только кадры видео, для которых записаны рамки (с
+    `start_frame` и шагом `stride` записи), и запись заканчивается вместе с
+    детекциями. Записанные рамки кадра возвращает `read_boxes` вместе с кадром.
+    """
+
+    def __init__(
+        self, path, detections=None, speed="realtime", loop=False, width=640, height=480
+    ):
+        self.path = path
+        self.loop = loop
+        self._video = None
+        self._stream = None
+        if is_detections_file(path):
+            detections = path
+        else:
+            self._video = cv2.VideoCapture(path)
+            if not self._video.isOpened():
+                raise IOError(f"Не удалось открыть видео: {path}")
+            width = int(self._video.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(self._video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        self.source_fps = 30.0
+        if self._video is not None:
+            self.source_fps = self._video.get(cv2.CAP_PROP_FPS) or 30.0
+        # Первый кадр видео и шаг между кадрами, для которых есть рамки
+        self.start_frame = 0
+        self.stride = 1
+        if detections is not None:
+            self._stream, meta = load_detections(detections)
+            self.stride = max(1, meta.get("stride", 1))
+            if self._video is None:
+                self.source_fps = meta.get("fps", self.source_fps)
+                width = meta.get("width", width)
+                height = meta.get("height", height)
+            else:
+                self.start_frame = meta.get("start_frame", 0)
+                self.source_fps /= self.stride
+                if self.start_frame:
+                    self._video.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+        self.width = width
+        self.height = height
+        self.target_fps = target_fps(speed, self.source_fps)
+
+        # Номер следующего кадра записи и число выданных кадров
+        self.position = 0
+        self.frames_read = 0
+        self._started_at = None
+
+    @property
+    def has_detections(self):
+        return self._stream is not None
+
+    def isOpened(self):
+        return self._video is not None or self._stream is not None
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.source_fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.position
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            if self._stream is not None:
+                return len(self._stream)
+            return self._video.get(prop)
+        return 0.0
+
+    def set(self, prop, value):
+        # Размер буфера и разрешение камеры к записи не относятся
+        return False
+
+    def _pace(self):
+        """Ждет момента выдачи очередного кадра; отставание не наверстывается пропуском кадров."""
+        now = time.perf_counter()
+        if self._started_at is None:
+            self._started_at = now
+        if self.target_fps:
+            delay = self._started_at + self.frames_read / self.target_fps - now
+            if delay > 0:
+                time.sleep(delay)
+
+    def _read_frame(self, image):
+        if self._stream is not None and self.position >= len(self._stream):
+            return False, None
+        if self._video is not None:
+            # Кадры между записанными пропускаются, как при записи с шагом
+            for _ in range(self.stride - 1 if self.position else 0):
+                if not self._video.grab():
+                    return False, None
+            return self._video.read(image)
+        shape = (self.height, self.width, 3)
+        if image is None or image.shape != shape:
+            image = np.empty(shape, dtype=np.uint8)
+        image.fill(48)
+        return True, image
+
+    def _rewind(self):
+        self.position = 0
+        if self._video is not None:
+            self._video.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+
+    def read(self, image=None):
+        """Возвращает `(ok, frame)`, как `cv2.VideoCapture.read`, в темпе `speed`."""
+        ret, frame, _ = self.read_boxes(image)
+        return ret, frame
+
+    def read_boxes(self, image=None):
+        """Возвращает `(ok, frame, boxes)`: кадр и записанные рамки этого кадра.
+
+        Без записи детекций `boxes` - None.
+        """
+        self._pace()
+        ret, frame = self._read_frame(image)
+        if not ret and self.loop and self.position:
+            self._rewind()
+            ret, frame = self._read_frame(image)
+        if not ret:
+            return False, None, None
+
+        boxes = self._stream[self.position] if self._stream is not None else None
+        self.position += 1
+        self.frames_read += 1
+        return True, frame, boxes
+
+    def release(self):
+        if self._video is not None:
+            self._video.release()
+
+
+class ReplayDetector(Detector):
+    """Детектор-заглушка для воспроизведения записи детекций: модель не нужна.
+
+    Записанные рамки приходят вместе с кадром из `ReplayCapture.read_boxes`
+    и передаются в подсчет напрямую; детектор на кадрах не вызывается.
+    """
+
+    def detect(self, frame):
+        raise RuntimeError("Рамки записи передаются вместе с кадром (ReplayCapture.read_boxes)")
+
+
+def replay_counting(capture, line_position=50, line_angle=0, max_frames=None):
+    """Прогоняет записанные детекции через трекинг и подсчет в темпе `capture`.
+
+    Возвращает события пересечения и сводку с достигнутой частотой кадров.
+    """
+    # Как в `count_video`: при прореживании кадров человек смещается дальше
+    engine = CountingEngine(
+        tracker=PeopleTracker(max_distance=100 * capture.stride),
+        line_position=line_position,
+        line_angle=line_angle,
+    )
+    events = []
+    frames = 0
+    started = time.perf_counter()
+    while max_frames is None or frames < max_frames:
+        ret, frame, boxes = capture.read_boxes()
+        if not ret:
+            break
+        result = engine.update(
+            boxes,
+            frame.shape[1],
+            frame.shape[0],
+            timestamp=(capture.position - 1) / capture.source_fps,
+        )
+        events.extend(result.events)
+        frames += 1
+    elapsed = time.perf_counter() - started
+    fps = frames / elapsed if elapsed else 0.0
+    return events, {
+        "count": engine.people_inside,
+        "events": len(events),
+        "frames": frames,
+        "elapsed_s": round(elapsed, 3),
+        "fps": round(fps, 1),
+        "realtime_factor": round(fps / capture.source_fps, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Прогон записанных детекций через трекинг и подсчет без камеры и модели"
+    )
+    parser.add_argument("input", help=".npz с детекциями или видеофайл (тогда нужен --detections)")
+    parser.add_argument("--detections", help=".npz с детекциями кадров видеофайла")
+    parser.add_argument(
+        "--speed", default="max", help="realtime, max, кратность (4x) или кадров в секунду"
+    )
+    parser.add_argument("--loop", action="store_true", help="повторять запись по кругу")
+    parser.add_argument("--frames", type=int, default=None, help="остановиться после N кадров")
+    parser.add_argument("--line-position", type=float, default=50, help="положение линии, 0-100")
+    parser.add_argument("--line-angle", type=float, default=0, help="угол линии, градусы")
+    args = parser.parse_args(argv)
+
+    capture = ReplayCapture(args.input, args.detections, speed=args.speed, loop=args.loop)
+    if not capture.has_detections:
+        parser.error("для видеофайла укажите --detections (counting.offline --save-detections)")
+    if args.loop and args.frames is None:
+        parser.error("с --loop укажите --frames")
+    try:
+        _, summary = replay_counting(
+            capture, args.line_position, args.line_angle, max_frames=args.frames
+        )
+    finally:
+        capture.release()
+    print(json.dumps({"input": os.path.basename(args.input), **summary}, ensure_ascii=False))
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+
+from .detector import Detector
+
+
+def line_band_roi(line_start, line_end, frame_width, frame_height, band, head_room, align=32):
+    """Прямоугольник `(x, y, w, h)` вокруг полосы шириной `±band` пикселей от линии.
+
+    Полоса обрезается по границам кадра, после чего прямоугольник расширяется
+    вверх на `head_room` пикселей: точка ног у линии, а туловище человека выше,
+    и детектору нужен весь силуэт. Размеры выравниваются до кратных `align`,
+    чтобы при letterbox модели не тратить пиксели на поля.
+    """
+    start = np.array(line_start, dtype=np.float32)
+    end = np.array(line_end, dtype=np.float32)
+    direction = end - start
+    length = float(np.hypot(*direction))
+    if length == 0:
+        return 0, 0, frame_width, frame_height
+    normal = np.array([-direction[1], direction[0]], dtype=np.float32) / length * band
+
+    band_polygon = np.array(
+        [start + normal, end + normal, end - normal, start - normal], dtype=np.float32
+    )
+    frame_polygon = np.array(
+        [[0, 0], [frame_width, 0], [frame_width, frame_height], [0, frame_height]],
+        dtype=np.float32,
+    )
+    area, intersection = cv2.intersectConvexConvex(band_polygon, frame_polygon)
+    if area <= 0 or intersection is None:
+        # Линия вне кадра: пересечений быть не может, но кадр не теряем
+        return 0, 0, frame_width, frame_height
+
+    points = intersection.reshape(-1, 2)
+    x1, y1 = np.floor(points.min(axis=0))
+    x2, y2 = np.ceil(points.max(axis=0))
+    y1 -= head_room
+
+    x1, y1 = max(0, int(x1)), max(0, int(y1))
+    x2, y2 = min(frame_width, int(x2)), min(frame_height, int(y2))
+
+    if align > 1:
+        # Расширяем до кратных `align`, сдвигая к краю кадра при необходимости
+        width = min(frame_width, -(-(x2 - x1) // align) * align)
+        height = min(frame_height, -(-(y2 - y1) // align) * align)
+        x1 = max(0, min(x1, frame_width - width))
+        y1 = max(0, min(y1, frame_height - height))
+        x2, y2 = x1 + width, y1 + height
+
+    return x1, y1, x2 - x1, y2 - y1
+
+
+class RoiDetector(Detector):
+    """Обертка детектора, обрабатывающая только полосу вокруг линии подсчета.
+
+    Пересечь линию могут только люди рядом с ней, поэтому детектор получает
+    вырезанную область, а рамки переводятся обратно в координаты кадра.
+    `band` и `head_room` задаются в долях высоты кадра; `band` должна быть
+    заметно больше смещения человека между кадрами, чтобы у трека успела
+    появиться позиция до пересечения.
+    """
+
+    def __init__(self, detector, line_points, band=0.15, head_room=0.35, align=32):
+        self.detector = detector
+        # Функция `(frame_width, frame_height) -> (line_start, line_end)`
+        self.line_points = line_points
+        self.band = band
+        self.head_room = head_room
+        self.align = align
+        self.weights = detector.weights
+        self._cache_key = None
+        self._cache_roi = None
+        self.pixels_total = 0
+        self.pixels_processed = 0
+
+    def load(self):
+        return self.detector.load()
+
+    def roi(self, frame_width, frame_height):
+        """Текущая область `(x, y, w, h)`; пересчитывается только при смене линии или кадра."""
+        line = self.line_points(frame_width, frame_height)
+        key = (line, frame_width, frame_height)
+        if key != self._cache_key:
+            self._cache_roi = line_band_roi(
+                line[0],
+                line[1],
+                frame_width,
+                frame_height,
+                self.band * frame_height,
+                self.head_room * frame_height,
+                self.align,
+            )
+            self._cache_key = key
+        return self._cache_roi
+
+    def _crop(self, frame):
+        x, y, w, h = self.roi(frame.shape[1], frame.shape[0])
+        self.pixels_total += frame.shape[0] * frame.shape[1]
+        self.pixels_processed += w * h
+        return frame[y : y + h, x : x + w], (x, y)
+
+    @staticmethod
+    def _shift(boxes, offset):
+        dx, dy = offset
+        return [[x1 + dx, y1 + dy, x2 + dx, y2 + dy] for x1, y1, x2, y2 in boxes]
+
+    def detect(self, frame):
+        crop, offset = self._crop(frame)
+        return self._shift(self.detector.detect(crop), offset)
+
+    def detect_batch(self, frames):
+        crops = [self._crop(frame) for frame in frames]
+        detections = self.detector.detect_batch([crop for crop, _ in crops])
+        return [self._shift(boxes, offset) for boxes, (_, offset) in zip(detections, crops)]
+
+    def pixel_ratio(self):
+        """Доля пикселей кадра, реально переданных детектору."""
+        return self.pixels_processed / self.pixels_total if self.pixels_total else 1.0
@@ -0,0 +1,158 @@
+import math
+import time
+from collections import deque
+
+import cv2
+
+
+class MotionGate:
+    """Дешевый детектор движения по разнице соседних кадров.
+
+    Кадр уменьшается до `width` пикселей по ширине и переводится в оттенки
+    серого, поэтому проверка стоит доли миллисекунды даже на слабом CPU.
+    Движение есть, если доля пикселей, изменившихся больше чем на
+    `threshold` уровней яркости, превышает `min_changed`.
+    """
+
+    def __init__(self, width=64, threshold=12, min_changed=0.002):
+        self.width = width
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self._previous = None
+        self.changed = 0.0
+
+    def reset(self):
+        self._previous = None
+        self.changed = 0.0
+
+    def update(self, frame):
+        """Сравнивает кадр с предыдущим и возвращает True, если в сцене есть движение."""
+        height = max(1, round(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        # Сглаживание подавляет шум матрицы камеры в темноте
+        gray = cv2.GaussianBlur(gray, (3, 3), 0)
+
+        previous, self._previous = self._previous, gray
+        if previous is None or previous.shape != gray.shape:
+            self.changed = 1.0
+            return True
+
+        diff = cv2.absdiff(gray, previous)
+        _, mask = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+        self.changed = cv2.countNonZero(mask) / diff.size
+        return self.changed > self.min_changed
+
+
+class AdaptiveScheduler:
+    """Решает, запускать ли детектор на очередном кадре.
+
+    Пока в сцене есть движение или живые треки (и еще `cooldown` секунд после
+    них), детекция идет на каждом кадре. В статичной пустой сцене модель
+    запускается не чаще раза в `idle_interval` секунд - на случай, если
+    человек вошел слишком медленно для детектора движения. Первое же движение
+    возвращает полную частоту без задержки.
+    """
+
+    def __init__(self, gate=None, idle_interval=2.0, cooldown=1.0, clock=time.monotonic):
+        self.gate = gate or MotionGate()
+        self.idle_interval = idle_interval
+        self.cooldown = cooldown
+        self.clock = clock
+        self.frames = 0
+        self.inferences = 0
+        self.skipped = 0
+        self.idle = False
+        self._last_active = None
+        self._last_inference = None
+
+    def reset(self):
+        self.gate.reset()
+        self.idle = False
+        self._last_active = None
+        self._last_inference = None
+
+    def should_detect(self, frame, active_tracks=0):
+        """Возвращает True, если на кадре нужно запустить детектор.
+
+        `active_tracks` - число живых треков: пока кто-то сопровождается,
+        детекция не пропускается, даже если человек стоит неподвижно.
+        """
+        now = self.clock()
+        self.frames += 1
+        moving = self.gate.update(frame)
+        if moving or active_tracks:
+            self._last_active = now
+
+        self.idle = self._last_active is None or now - self._last_active >= self.cooldown
+        if (
+            not self.idle
+            or self._last_inference is None
+            or now - self._last_inference >= self.idle_interval
+        ):
+            self._last_inference = now
+            self.inferences += 1
+            return True
+
+        self.skipped += 1
+        return False
+
+    def stats(self):
+        return {
+            "mode": "idle" if self.idle else "active",
+            "frames": self.frames,
+            "inferences": self.inferences,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+            "motion": round(self.gate.changed, 4),
+        }
+
+
+class DetectionInterval:
+    """Детекция раз в `every` кадров с прогнозом треков на промежуточных кадрах.
+
+    Если задан `target_fps`, интервал подбирается по задержке модели: за
+    интервал один проход детектора должен укладываться в бюджет времени
+    `every / target_fps`. Интервал ограничен `max_every`, чтобы прогноз по
+    постоянной скорости не расходился с реальным движением.
+    """
+
+    def __init__(self, every=1, target_fps=None, max_every=4, window=30):
+        self.every = max(1, int(every))
+        self.target_fps = target_fps
+        self.max_every = max(1, int(max_every))
+        self._latencies = deque(maxlen=window)
+        self._since_detection = None
+        self.detections = 0
+        self.propagated = 0
+
+    def reset(self):
+        self._since_detection = None
+
+    def should_detect(self):
+        """Возвращает True, если на очередном кадре нужна детекция, иначе - прогноз."""
+        if self._since_detection is None or self._since_detection + 1 >= self.every:
+            self._since_detection = 0
+            self.detections += 1
+            return True
+        self._since_detection += 1
+        self.propagated += 1
+        return False
+
+    def record(self, seconds):
+        """Учитывает задержку прохода детектора и при `target_fps` пересчитывает интервал."""
+        self._latencies.append(seconds)
+        if self.target_fps:
+            latency = sum(self._latencies) / len(self._latencies)
+            self.every = min(self.max_every, max(1, math.ceil(latency * self.target_fps)))
+
+    def stats(self):
+        latencies = self._latencies
+        return {
+            "every": self.every,
+            "detections": self.detections,
+            "propagated": self.propagated,
+            "detect_ms": (
+                round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0
+            ),
+        }
@@ -0,0 +1,285 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from .detector import create_detector
+from .engine import CrossingEvent
+from .offline import (
+    build_parser,
+    cache_options,
+    count_video,
+    detector_options,
+    roi_options,
+    write_events,
+)
+from .trajectories import Trajectories
+
+# Смещение ID треков между сегментами, чтобы ID разных процессов не совпадали
+TRACK_ID_STRIDE = 1_000_000
+
+
+class ShardedResult:
+    """Объединенный итог сегментированной обработки записи."""
+
+    def __init__(self, events, count, frames_read, elapsed, segments, baseline_elapsed=None):
+        self.events = events
+        self.count = count
+        self.frames_read = frames_read
+        self.elapsed = elapsed
+        # Список словарей со статистикой каждого сегмента
+        self.segments = segments
+        self.baseline_elapsed = baseline_elapsed
+
+    @property
+    def speedup(self):
+        """Ускорение относительно одного процесса.
+
+        Если был замерен однопроцессный прогон, используется он, иначе - сумма
+        времени работы сегментов (оценка последовательной обработки).
+        """
+        serial = self.baseline_elapsed
+        if serial is None:
+            serial = sum(segment["elapsed_s"] for segment in self.segments)
+        return serial / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "events": len(self.events),
+            "frames_read": self.frames_read,
+            "segments": len(self.segments),
+            "elapsed_s": round(self.elapsed, 2),
+            "baseline_s": (
+                round(self.baseline_elapsed, 2) if self.baseline_elapsed is not None else None
+            ),
+            "speedup": round(self.speedup, 2),
+        }
+
+
+def plan_segments(total_frames, segments, overlap, first_frame=0):
+    """Делит кадры `[first_frame, total_frames)` на `segments` отрезков `(warmup_start, start, end)`.
+
+    Кадры `[warmup_start, start)` обрабатываются только для прогрева трекера:
+    у людей, уже находящихся в кадре на границе, появляется предыдущая
+    позиция, а события из этого окна отбрасываются - их засчитывает
+    предыдущий сегмент.
+    """
+    frames = max(0, total_frames - first_frame)
+    segments = max(1, min(segments, frames))
+    size = max(1, -(-frames // segments))
+    plan = []
+    for start in range(first_frame, total_frames, size):
+        end = min(start + size, total_frames)
+        plan.append((max(first_frame, start - overlap), start, end))
+    return plan
+
+
+def _init_worker(threads):
+    # Ограничиваем потоки PyTorch, чтобы процессы не конкурировали за ядра
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    cv2.setNumThreads(threads)
+
+
+def _process_segment(task):
+    (
+        index,
+        input_path,
+        warmup_start,
+        start,
+        end,
+        detector_options,
+        count_options,
+        record_tracks,
+    ) = task
+    result = count_video(
+        input_path,
+        detector=create_detector(**detector_options),
+        start_frame=warmup_start,
+        end_frame=end,
+        record_tracks=record_tracks,
+        **count_options,
+    )
+    events = [
+        CrossingEvent(
+            event.track_id + index * TRACK_ID_STRIDE,
+            event.direction,
+            event.position,
+            event.frame_index,
+            event.timestamp,
+        )
+        for event in result.events
+        if event.frame_index >= start
+    ]
+    trajectories = result.trajectories
+    if trajectories is not None:
+        # Последняя точка трека перед началом сегмента нужна как предыдущая
+        # позиция для шага на первый кадр сегмента: события засчитываются с
+        # кадра `start`
+        trajectories = trajectories.since(start)
+        trajectories.track_ids += index * TRACK_ID_STRIDE
+    return index, events, trajectories, {
+        "segment": index,
+        "start": start,
+        "end": end,
+        "warmup_frames": start - warmup_start,
+        "events": len(events),
+        "frames_read": result.frames_read,
+        "elapsed_s": round(result.elapsed, 2),
+    }
+
+
+def merge_events(events):
+    """Сортирует события по времени и пересчитывает счетчик с отсечкой снизу нулем."""
+    events = sorted(events, key=lambda event: (event.frame_index, event.track_id))
+    count = 0
+    for event in events:
+        if event.direction == "in":
+            count += 1
+        else:
+            count = max(0, count - 1)
+    return events, count
+
+
+def count_video_sharded(
+    input_path,
+    workers=None,
+    segments=None,
+    overlap=None,
+    detector_options=None,
+    baseline=False,
+    start_frame=0,
+    end_frame=None,
+    tracks_path=None,
+    **count_options,
+):
+    """Обрабатывает запись параллельно пулом процессов и сводит события в одну ленту.
+
+    `overlap` - число кадров прогрева перед началом каждого сегмента (по
+    умолчанию две секунды записи). Если `baseline` истинно, дополнительно
+    выполняется однопроцессный прогон для честного замера ускорения.
+    Если задан `tracks_path`, траектории сегментов сводятся в один .npz.
+    """
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise IOError(f"Не удалось открыть видео: {input_path}")
+    # Число кадров из заголовка - оценка: последний сегмент все равно читается
+    # до конца файла, а по оценке только делится запись
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if end_frame is not None:
+        total_frames = min(total_frames, end_frame) if total_frames > 0 else end_frame
+    video_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    if total_frames <= 0:
+        raise IOError(f"Не удалось определить число кадров видео: {input_path}")
+
+    workers = workers or os.cpu_count() or 1
+    segments = segments or workers
+    if overlap is None:
+        overlap = int(video_fps * 2)
+    detector_options = detector_options or {}
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    plan = plan_segments(total_frames, segments, overlap, start_frame)
+    if not plan:
+        raise ValueError(
+            f"Нет кадров для обработки: кадры {start_frame}-{total_frames} видео {input_path}"
+        )
+    # Без явного end_frame последний сегмент читает файл до конца
+    last_start = plan[-1][1]
+    tasks = [
+        (
+            index,
+            input_path,
+            warmup_start,
+            start,
+            end_frame if start == last_start else end,
+            detector_options,
+            count_options,
+            bool(tracks_path),
+        )
+        for index, (warmup_start, start, end) in enumerate(plan)
+    ]
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(threads,)
+    ) as pool:
+        results = sorted(pool.map(_process_segment, tasks), key=lambda item: item[0])
+    elapsed = time.perf_counter() - started
+
+    events, count = merge_events(
+        [event for _, segment_events, _, _ in results for event in segment_events]
+    )
+    segment_stats = [stats for _, _, _, stats in results]
+    if tracks_path:
+        Trajectories.concatenate([tracks for _, _, tracks, _ in results]).save(tracks_path)
+
+    baseline_elapsed = None
+    if baseline:
+        baseline_elapsed = count_video(
+            input_path,
+            detector=create_detector(**detector_options),
+            start_frame=start_frame,
+            end_frame=end_frame,
+            **count_options,
+        ).elapsed
+
+    return ShardedResult(
+        events,
+        count,
+        sum(stats["frames_read"] for stats in segment_stats),
+        elapsed,
+        segment_stats,
+        baseline_elapsed,
+    )
+
+
+def main(argv=None):
+    parser = build_parser()
+    parser.description = "Параллельный офлайн-подсчет людей по длинной записи"
+    parser.add_argument("--workers", type=int, default=None, help="число процессов")
+    parser.add_argument("--segments", type=int, default=None, help="число сегментов")
+    parser.add_argument("--overlap", type=int, default=None, help="кадров прогрева на границе")
+    parser.add_argument(
+        "--baseline", action="store_true", help="замерить однопроцессный прогон для сравнения"
+    )
+    args = parser.parse_args(argv)
+    if args.output:
+        parser.error("--output не поддерживается в сегментированном режиме")
+    if args.save_detections:
+        parser.error("--save-detections не поддерживается в сегментированном режиме")
+
+    result = count_video_sharded(
+        args.input,
+        workers=args.workers,
+        segments=args.segments,
+        overlap=args.overlap,
+        detector_options=detector_options(args),
+        baseline=args.baseline,
+        line_position=args.line_position,
+        line_angle=args.line_angle,
+        stride=args.stride,
+        batch_size=args.batch_size,
+        start_frame=args.start_frame,
+        end_frame=args.end_frame,
+        roi=roi_options(args),
+        cache=cache_options(args),
+        tracks_path=args.save_tracks,
+    )
+    if args.events:
+        write_events(result.events, args.events)
+    summary = {"input": os.path.basename(args.input), **result.summary()}
+    print(json.dumps(summary, ensure_ascii=False))
+    return result
+
+
+if __name__ == "__main__":
+    main()
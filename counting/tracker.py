@@ -0,0 +1,176 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+
+class Track:
+    """Сопровождаемый человек: последняя точка ног, рамка и число пропущенных кадров.
+
+    Для прогноза между детекциями трек хранит сглаженную скорость (пикселей
+    за кадр), последнюю обнаруженную точку и рамку (`anchor`, `anchor_box`) и
+    число кадров `steps`, прошедших с этой детекции.
+    """
+
+    __slots__ = (
+        "track_id",
+        "position",
+        "box",
+        "missed",
+        "velocity",
+        "anchor",
+        "anchor_box",
+        "steps",
+    )
+
+    def __init__(self, track_id, position, box):
+        self.track_id = track_id
+        self.position = position
+        self.box = box
+        self.missed = 0
+        self.velocity = None
+        self.anchor = position
+        self.anchor_box = box
+        self.steps = 0
+
+    def observe(self, position, box, smoothing):
+        """Принимает новую детекцию и обновляет оценку скорости."""
+        steps = self.steps + 1
+        measured = (
+            (position[0] - self.anchor[0]) / steps,
+            (position[1] - self.anchor[1]) / steps,
+        )
+        if self.velocity is None:
+            self.velocity = measured
+        else:
+            vx, vy = self.velocity
+            self.velocity = (
+                smoothing * measured[0] + (1 - smoothing) * vx,
+                smoothing * measured[1] + (1 - smoothing) * vy,
+            )
+        self.position = self.anchor = position
+        self.box = self.anchor_box = box
+        self.steps = 0
+        self.missed = 0
+
+    def predict(self):
+        """Сдвигает точку и рамку на следующий кадр по постоянной скорости."""
+        self.steps += 1
+        vx, vy = self.velocity
+        dx, dy = round(vx * self.steps), round(vy * self.steps)
+        x1, y1, x2, y2 = self.anchor_box
+        self.position = (self.anchor[0] + dx, self.anchor[1] + dy)
+        self.box = [x1 + dx, y1 + dy, x2 + dx, y2 + dy]
+
+
+class PeopleTracker:
+    """Трекер людей по точке ног с оптимальным сопоставлением детекций.
+
+    Матрица расстояний между всеми детекциями и треками считается NumPy за один
+    проход, сопоставление выполняется венгерским алгоритмом, а треки живут еще
+    `max_missed` кадров после пропажи, чтобы кратковременные пропуски детекции
+    не порождали новые ID и повторный подсчет пересечений.
+    """
+
+    def __init__(self, max_distance=100, max_missed=5, velocity_smoothing=0.5):
+        # Максимальное допустимое перемещение точки между кадрами, пиксели
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        # Вес новой оценки скорости в экспоненциальном сглаживании (0-1]
+        self.velocity_smoothing = velocity_smoothing
+        self.tracks = {}
+        # Монотонный счетчик ID: идентификаторы никогда не переиспользуются
+        self._next_id = 0
+
+    @staticmethod
+    def foot_position(box):
+        """Точка ног: центр нижней стороны рамки `[x1, y1, x2, y2]`."""
+        x1, _, x2, y2 = box
+        return (int((x1 + x2) / 2), int(y2))
+
+    def reset(self):
+        self.tracks = {}
+        self._next_id = 0
+
+    def positions(self):
+        """Словарь `{track_id: (x, y)}` всех живых треков."""
+        return {track_id: track.position for track_id, track in self.tracks.items()}
+
+    def _match(self, points):
+        """Возвращает пары (индекс детекции, ID трека) с расстоянием не больше порога."""
+        if not self.tracks or len(points) == 0:
+            return []
+
+        track_ids = list(self.tracks)
+        track_points = np.array(
+            [self.tracks[track_id].position for track_id in track_ids], dtype=np.float32
+        )
+        # Матрица расстояний N детекций x M треков
+        cost = np.linalg.norm(points[:, None, :] - track_points[None, :, :], axis=2)
+        # Недопустимые пары получают заведомо невыгодную стоимость
+        gated = np.where(cost <= self.max_distance, cost, self.max_distance * 1e3)
+        rows, cols = linear_sum_assignment(gated)
+        keep = cost[rows, cols] <= self.max_distance
+        return [(int(r), track_ids[c]) for r, c in zip(rows[keep], cols[keep])]
+
+    def update(self, boxes):
+        """Обновляет треки по детекциям текущего кадра.
+
+        Возвращает список `(track_id, box, position, previous_position)` для каждой
+        детекции; `previous_position` равна `None` для только что созданного трека.
+        Предыдущая позиция - последняя обнаруженная точка трека (`anchor`), а не
+        прогноз: промах прогноза не должен выглядеть как движение человека.
+        """
+        points = np.array(
+            [self.foot_position(box) for box in boxes], dtype=np.float32
+        ).reshape(-1, 2)
+
+        matches = dict(self._match(points))
+        seen_ids = set()
+
+        results = []
+        for i, box in enumerate(boxes):
+            position = self.foot_position(box)
+            track_id = matches.get(i)
+            if track_id is None:
+                track_id = self._next_id
+                self._next_id += 1
+                self.tracks[track_id] = Track(track_id, position, box)
+                seen_ids.add(track_id)
+                results.append((track_id, box, position, None))
+                continue
+
+            track = self.tracks[track_id]
+            results.append((track_id, box, position, track.anchor))
+            track.observe(position, box, self.velocity_smoothing)
+            seen_ids.add(track_id)
+
+        # Несопоставленные треки стареют и удаляются после `max_missed` пропусков
+        for track_id in list(self.tracks):
+            if track_id in seen_ids:
+                continue
+            track = self.tracks[track_id]
+            track.missed += 1
+            track.steps += 1
+            if track.missed > self.max_missed:
+                del self.tracks[track_id]
+
+        return results
+
+    def predict(self):
+        """Продвигает треки на один кадр без детекции по модели постоянной скорости.
+
+        Прогнозируются треки, найденные на последней детекции и имеющие оценку
+        скорости. Новые треки остаются на месте, пропавшие - на месте и не
+        попадают в результат. Формат результата тот же, что у `update`.
+        """
+        results = []
+        for track in self.tracks.values():
+            previous = track.position
+            if track.missed or track.velocity is None:
+                # Кадр прошел, даже если сдвигать трек не по чему
+                track.steps += 1
+                if track.missed:
+                    continue
+            else:
+                track.predict()
+            results.append((track.track_id, track.box, track.position, previous))
+        return results
@@ -0,0 +1,245 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from .engine import CountingEngine
+
+# Точек в одном блоке векторного пересчета (память - блок на число линий)
+RECOUNT_CHUNK = 1_000_000
+
+
+class Trajectories:
+    """Траектории треков в виде плоских массивов: ID трека, номер кадра, точка ног.
+
+    Одна строка - положение трека на кадре, на котором он попал в результат
+    `CountingEngine`. Хранятся в .npz (int32), около 16 байт на точку.
+    """
+
+    def __init__(self, track_ids, frames, points, fps=30.0, width=None, height=None):
+        self.track_ids = np.asarray(track_ids, dtype=np.int32).reshape(-1)
+        self.frames = np.asarray(frames, dtype=np.int32).reshape(-1)
+        self.points = np.asarray(points, dtype=np.int32).reshape(-1, 2)
+        self.fps = fps
+        self.width = width
+        self.height = height
+
+    def __len__(self):
+        return len(self.frames)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data["track_ids"],
+                data["frames"],
+                data["points"],
+                fps=float(data["fps"]),
+                width=int(data["width"]),
+                height=int(data["height"]),
+            )
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            track_ids=self.track_ids,
+            frames=self.frames,
+            points=self.points,
+            fps=np.float32(self.fps),
+            width=np.int32(self.width),
+            height=np.int32(self.height),
+        )
+
+    @classmethod
+    def concatenate(cls, parts):
+        """Склеивает траектории сегментов одной записи (ID треков не должны совпадать)."""
+        first = parts[0]
+        return cls(
+            np.concatenate([part.track_ids for part in parts]),
+            np.concatenate([part.frames for part in parts]),
+            np.concatenate([part.points for part in parts]),
+            fps=first.fps,
+            width=first.width,
+            height=first.height,
+        )
+
+    def select(self, mask):
+        return Trajectories(
+            self.track_ids[mask],
+            self.frames[mask],
+            self.points[mask],
+            fps=self.fps,
+            width=self.width,
+            height=self.height,
+        )
+
+    def since(self, start):
+        """Точки с кадра `start` и последняя точка каждого трека перед ним.
+
+        Последняя точка - предыдущая позиция для первого шага трека с кадра
+        `start`; при прореживании кадров она может быть дальше `start - 1`.
+        """
+        before = np.flatnonzero(self.frames < start)
+        order = before[np.lexsort((self.frames[before], self.track_ids[before]))]
+        track_ids = self.track_ids[order]
+        last = order[np.append(track_ids[1:] != track_ids[:-1], True)] if len(order) else order
+        mask = self.frames >= start
+        mask[last] = True
+        return self.select(mask)
+
+    def ordered(self):
+        """Точки, упорядоченные по треку и кадру, и маска шагов внутри трека.
+
+        `same_track[i]` истинно, если точки `i` и `i + 1` принадлежат одному
+        треку: это те же пары (предыдущая позиция, текущая), что
+        `CountingEngine` проверяет на пересечение, даже если между ними были
+        пропущенные кадры.
+        """
+        order = np.lexsort((self.frames, self.track_ids))
+        track_ids = self.track_ids[order]
+        return self.points[order], track_ids[1:] == track_ids[:-1]
+
+
+class TrajectoryRecorder:
+    """Собирает траектории из результатов `CountingEngine` кадр за кадром."""
+
+    def __init__(self):
+        self._track_ids = []
+        self._frames = []
+        self._points = []
+
+    def add(self, result):
+        for track_id, _, position, _ in result.tracks:
+            self._track_ids.append(track_id)
+            self._frames.append(result.frame_index)
+            self._points.append(position)
+
+    def trajectories(self, fps=30.0, width=None, height=None):
+        return Trajectories(
+            self._track_ids, self._frames, self._points, fps=fps, width=width, height=height
+        )
+
+
+def line_models(lines, width, height):
+    """`LineModel` для списка линий `(position, angle)` на кадре заданного размера."""
+    return [
+        CountingEngine(line_position=position, line_angle=angle).line_model(width, height)
+        for position, angle in lines
+    ]
+
+
+def recount(trajectories, lines, chunk_size=RECOUNT_CHUNK):
+    """Входы и выходы для каждой линии `(position, angle)` по сохраненным траекториям.
+
+    Стороны точек считаются тем же выражением `a*x + b*y + c`, что и
+    `LineModel` (векторное произведение `point_position_relative_to_line`),
+    сразу для всех точек и всех линий: точки x линии - одно умножение
+    матриц на блок из `chunk_size` точек.
+    """
+    models = line_models(lines, trajectories.width, trajectories.height)
+    normals = np.array([model.normal for model in models]).reshape(-1, 2).T
+    offsets = np.array([model.offset for model in models], dtype=np.float64)
+    in_signs = np.array([model.in_sign > 0 for model in models], dtype=bool)
+
+    # Пересечения с положительной стороны на отрицательную и обратно; как и в
+    # `CountingEngine`, точка ровно на линии не относится ни к одной стороне
+    down = np.zeros(len(models), dtype=np.int64)
+    up = np.zeros(len(models), dtype=np.int64)
+    points, same_track = trajectories.ordered()
+    for start in range(0, len(same_track), chunk_size):
+        # Блоки перекрываются на одну точку: последняя точка - начало следующего шага
+        block = points[start : start + chunk_size + 1].astype(np.float64)
+        sides = np.sign(block @ normals + offsets).astype(np.int8)
+        change = sides[1:] - sides[:-1]
+        change *= same_track[start : start + chunk_size, None]
+        down += (change == -2).sum(axis=0)
+        up += (change == 2).sum(axis=0)
+    # Направление как в `LineModel.direction`: по стороне предыдущей точки
+    entered = np.where(in_signs, down, up)
+    exited = np.where(in_signs, up, down)
+
+    return [
+        {
+            "line_position": position,
+            "line_angle": angle,
+            "in": int(entered[k]),
+            "out": int(exited[k]),
+            "net": int(entered[k] - exited[k]),
+        }
+        for k, (position, angle) in enumerate(lines)
+    ]
+
+
+def _value_range(text):
+    """"30:70:5" -> [30, 35, ..., 70]; одно число -> [число]."""
+    parts = [float(part) for part in text.split(":")]
+    if len(parts) == 1:
+        return parts
+    start, stop = parts[0], parts[1]
+    step = parts[2] if len(parts) > 2 else 1.0
+    return [float(value) for value in np.arange(start, stop + step / 2, step)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Пересчет входов и выходов по сохраненным траекториям для других линий"
+    )
+    parser.add_argument("tracks", help="траектории (.npz, counting.offline --save-tracks)")
+    parser.add_argument(
+        "--line",
+        action="append",
+        default=[],
+        metavar="POSITION,ANGLE",
+        help="линия для проверки (можно несколько раз)",
+    )
+    parser.add_argument("--positions", help="перебор положений: 30:70:5 (от:до:шаг)")
+    parser.add_argument("--angles", default="0", help="перебор углов вместе с --positions")
+    parser.add_argument("--start-frame", type=int, default=None)
+    parser.add_argument("--end-frame", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    lines = []
+    for line in args.line:
+        position, _, angle = line.partition(",")
+        lines.append((float(position), float(angle or 0)))
+    if args.positions:
+        lines.extend(
+            (position, angle)
+            for position in _value_range(args.positions)
+            for angle in _value_range(args.angles)
+        )
+    if not lines:
+        parser.error("укажите --line или --positions")
+
+    trajectories = Trajectories.load(args.tracks)
+    if args.start_frame is not None or args.end_frame is not None:
+        mask = np.ones(len(trajectories), dtype=bool)
+        if args.start_frame is not None:
+            mask &= trajectories.frames >= args.start_frame
+        if args.end_frame is not None:
+            mask &= trajectories.frames < args.end_frame
+        trajectories = trajectories.select(mask)
+
+    started = time.perf_counter()
+    results = recount(trajectories, lines)
+    elapsed = time.perf_counter() - started
+    for row in results:
+        print(json.dumps(row, ensure_ascii=False))
+    print(
+        json.dumps(
+            {
+                "input": os.path.basename(args.tracks),
+                "points": len(trajectories),
+                "lines": len(lines),
+                "elapsed_s": round(elapsed, 3),
+            },
+            ensure_ascii=False,
+        )
+    )
+    return results
+
+
+if __name__ == "__main__":
+    main()
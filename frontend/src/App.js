@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from "react";
+import React, { useState, useEffect, useCallback, useRef } from "react";
 import { ThemeProvider, createTheme } from "@mui/material/styles";
 import {
   Container,
@@ -116,18 +116,22 @@ function App() {
   const [peopleCount, setPeopleCount] = useState(0);
   const [linePosition, setLinePosition] = useState(50);
   const [lineAngle, setLineAngle] = useState(0);
-  const [countUpdateInterval, setCountUpdateInterval] = useState(null);
   const [streamVersion, setStreamVersion] = useState(0);
+  // Функция отписки от потока событий подсчета
+  const unsubscribeRef = useRef(null);
 
-  const updateCount = useCallback(async () => {
-    try {
-      const count = await api.getPeopleCount();
-      setPeopleCount(count);
-    } catch (error) {
-      console.error("Ошибка при обновлении счетчика:", error);
+  const unsubscribeFromEvents = useCallback(() => {
+    if (unsubscribeRef.current) {
+      unsubscribeRef.current();
+      unsubscribeRef.current = null;
     }
   }, []);
 
+  const subscribeToEvents = useCallback(() => {
+    unsubscribeFromEvents();
+    unsubscribeRef.current = api.subscribeToEvents({ onCount: setPeopleCount });
+  }, [unsubscribeFromEvents]);
+
   const handleLineSettingsChange = useCallback(async (position, angle) => {
     try {
       await api.updateLineSettings(position, angle);
@@ -154,19 +158,26 @@ function App() {
 
   const handleStart = async () => {
     try {
-      await api.startSystem();
+      const state = await api.startSystem();
       setStreamVersion((v) => v + 1);
-      // Сбрасываем локальные состояния к дефолту
-      setPeopleCount(0);
-      setLinePosition(50);
-      setLineAngle(0);
-      // Синхронизируем дефолтные настройки линии с бэкендом
+      // Бэкенд восстанавливает счетчик и линию из снимка прошлого запуска
+      const position = state.line_position ?? 50;
+      const angle = state.line_angle ?? 0;
+      setPeopleCount(state.count ?? 0);
+      setLinePosition(position);
+      setLineAngle(angle);
+      // Синхронизируем настройки линии с бэкендом
       try {
-        await api.updateLineSettings(50, 0);
+        await api.updateLineSettings(position, angle);
       } catch (e) {
-        console.error("Не удалось применить дефолтные настройки линии на бэкенде:", e);
+        console.error("Не удалось применить настройки линии на бэкенде:", e);
       }
       setIsRunning(true);
+      // Прошлый запуск прервался во время подсчета - подсчет уже возобновлен
+      if (state.counting) {
+        setIsCountingStarted(true);
+        subscribeToEvents();
+      }
     } catch (error) {
       console.error("Ошибка при запуске системы:", error);
     }
@@ -176,8 +187,7 @@ function App() {
     try {
       await api.startCounting();
       setIsCountingStarted(true);
-      const interval = setInterval(updateCount, 1000);
-      setCountUpdateInterval(interval);
+      subscribeToEvents();
     } catch (error) {
       console.error("Ошибка при запуске подсчета:", error);
     }
@@ -195,10 +205,7 @@ function App() {
       if (response.status === 200) {
         setIsRunning(false);
         setIsCountingStarted(false);
-        if (countUpdateInterval) {
-          clearInterval(countUpdateInterval);
-          setCountUpdateInterval(null);
-        }
+        unsubscribeFromEvents();
         // Инкрементируем версию, чтобы принудительно размонтировать/перемонтировать img
         setStreamVersion((v) => v + 1);
       }
@@ -215,12 +222,8 @@ function App() {
   }, []);
 
   useEffect(() => {
-    return () => {
-      if (countUpdateInterval) {
-        clearInterval(countUpdateInterval);
-      }
-    };
-  }, [countUpdateInterval]);
+    return unsubscribeFromEvents;
+  }, [unsubscribeFromEvents]);
 
   return (
     <ThemeProvider theme={theme}>
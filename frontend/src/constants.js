@@ -3,6 +3,7 @@ export const API_BASE_URL = "http://localhost:8000/api";
 export const ENDPOINTS = {
   UPDATE_LINE: "/update_line/",
   COUNT: "/count/",
+  EVENTS: "/events/",
   START: "/start/",
   START_COUNTING: "/start_counting/",
   STOP: "/stop/",
@@ -28,6 +28,31 @@ export const getPeopleCount = async () => {
   }
 };
 
+// Подписка на изменения счетчика и пересечения линии (Server-Sent Events).
+// Возвращает функцию отписки; при обрыве EventSource переподключается сам
+// и досылает пропущенные события по Last-Event-ID.
+export const subscribeToEvents = ({ onCount, onCrossing, onError } = {}) => {
+  const source = new EventSource(`${API_BASE_URL}${ENDPOINTS.EVENTS}`);
+
+  source.addEventListener("count", (event) => {
+    const data = JSON.parse(event.data);
+    if (onCount) onCount(data.count);
+  });
+
+  source.addEventListener("crossing", (event) => {
+    const data = JSON.parse(event.data);
+    if (onCount) onCount(data.count);
+    if (onCrossing) onCrossing(data);
+  });
+
+  source.onerror = (error) => {
+    console.error("Ошибка в потоке событий:", error);
+    if (onError) onError(error);
+  };
+
+  return () => source.close();
+};
+
 export const startSystem = async () => {
   try {
     const response = await api.post(ENDPOINTS.START);
@@ -3,8 +3,11 @@ import numpy as np
 import tkinter as tk
 from tkinter import ttk
 from PIL import Image, ImageTk
-import math
-from ultralytics import YOLO
+
+from counting.camera import open_camera
+from counting.detector import PeopleDetector
+from counting.engine import CountingEngine
+from counting.offline import count_video, write_events
 
 
 class PeopleCounter:
@@ -13,20 +16,15 @@ class PeopleCounter:
         self.root = root
         self.root.title("Система подсчета людей")
 
-        self.model = None
+        # Детектор людей (модель загружается при первом обращении в режиме подсчета)
+        self.detector = PeopleDetector()
 
         with open("coco.names", "r") as f:
             self.classes = f.read().strip().split("\n")
 
-        # Счетчик людей, находящихся внутри помещения
-        # Будет увеличиваться, когда люди пересекают линию в одном направлении
-        # и уменьшаться - в другом
-        self.people_inside = 0
-
-        # Словарь для хранения предыдущих позиций людей
-        # Ключ - ID человека, значение - его координаты
-        # Нужен для определения, пересек ли человек линию
-        self.previous_positions = {}
+        # Ядро трекинга и подсчета, общее с веб-бэкендом
+        # Хранит счетчик людей внутри помещения и позиции треков
+        self.engine = CountingEngine(detector=self.detect_people)
 
         # Флаг, показывающий, находимся ли мы в режиме настройки линии
         # True - можно настраивать линию, False - идет подсчет людей
@@ -35,21 +33,7 @@ class PeopleCounter:
         self.setup_ui()
 
         # Инициализируем камеру (0 - обычно встроенная камера ноутбука)
-        # На Windows ускоряет открытие: CAP_DSHOW
-        try:
-            self.cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-            if not self.cap or not self.cap.isOpened():
-                self.cap = cv2.VideoCapture(0)
-        except Exception:
-            self.cap = cv2.VideoCapture(0)
-        # Уменьшаем задержки буфера и ставим пониженное разрешение
-        try:
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-        except Exception:
-            pass
-        # Устанавливаем пониженное разрешение камеры для лучшей производительности
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 480)  # Ширина кадра
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 360)  # Высота кадра
+        self.cap = open_camera(0)
 
         # Запускаем предварительный просмотр для настройки линии
         self.setup_preview()
@@ -86,6 +70,10 @@ class PeopleCounter:
         )
         # Устанавливаем начальное положение слайдера на середину (50%)
         self.line_position.set(50)
+        # Передаем значение в ядро подсчета при каждом изменении слайдера
+        self.line_position.configure(
+            command=lambda value: self.engine.set_line(position=value)
+        )
         self.line_position.pack()
 
         # Создаем подпись для второго слайдера
@@ -100,6 +88,9 @@ class PeopleCounter:
         )
         # Устанавливаем начальный угол 0 градусов (горизонтальная линия)
         self.line_angle.set(0)
+        self.line_angle.configure(
+            command=lambda value: self.engine.set_line(angle=value)
+        )
         self.line_angle.pack()
 
         # Создаем кнопку для начала подсчета людей
@@ -123,67 +114,27 @@ class PeopleCounter:
         # Размещаем метку с отступом 10 пикселей по горизонтали
         self.count_label.pack(padx=10)
 
+    @property
+    def people_inside(self):
+        """Количество людей внутри помещения (хранится в ядре подсчета)."""
+        return self.engine.people_inside
+
+    @people_inside.setter
+    def people_inside(self, value):
+        self.engine.people_inside = value
+
+    @property
+    def previous_positions(self):
+        """Последние позиции треков `{track_id: (x, y)}`."""
+        return self.engine.tracker.positions()
+
     def get_line_points(self, frame_width, frame_height):
         """Вычисляет координаты начала и конца линии подсчета с учетом соотношения сторон кадра"""
-        # Центр кадра
-        center_x = frame_width // 2
-        center_y = frame_height // 2
-
-        # Получаем угол и переводим в радианы
-        angle = self.line_angle.get()
-        angle_rad = math.radians(angle)
-
-        # Вычисляем коэффициент масштабирования смещения в зависимости от угла
-        # При 0° и 180° (горизонтальная линия) используем высоту кадра
-        # При 90° и 270° (вертикальная линия) используем ширину кадра
-        # Между ними - плавный переход
-        vertical_factor = abs(math.sin(angle_rad))
-        horizontal_factor = abs(math.cos(angle_rad))
-
-        max_offset = max(frame_width, frame_height)
-
-        # Вычисляем смещение с учетом угла наклона
-        base_offset = (self.line_position.get() - 50) / 50.0  # От -1 до 1
-        offset_x = base_offset * frame_width * vertical_factor
-        offset_y = base_offset * frame_height * horizontal_factor
-
-        # Используем длину, гарантирующую пересечение кадра при любом угле
-        line_length = math.sqrt(frame_width**2 + frame_height**2) * 1.5
-        half_length = line_length / 2
-
-        # Вычисляем базовые точки линии
-        x1 = center_x + half_length * math.cos(angle_rad)
-        y1 = center_y + half_length * math.sin(angle_rad)
-        x2 = center_x - half_length * math.cos(angle_rad)
-        y2 = center_y - half_length * math.sin(angle_rad)
-
-        # Применяем смещение в зависимости от угла
-        x1 += offset_x
-        x2 += offset_x
-        y1 += offset_y
-        y2 += offset_y
-
-        return (int(x1), int(y1)), (int(x2), int(y2))
+        return self.engine.get_line_points(frame_width, frame_height)
 
     def point_position_relative_to_line(self, point, line_start, line_end):
-        """Определяет, с какой стороны от линии находится точка
-
-        Использует векторное произведение для определения положения точки:
-        - Если результат > 0, точка находится с одной стороны линии
-        - Если результат < 0, точка находится с другой стороны
-        - Если результат = 0, точка лежит на линии
-        """
-        # Получаем координаты проверяемой точки
-        x, y = point
-        # Получаем координаты начала линии
-        x1, y1 = line_start
-        # Получаем координаты конца линии
-        x2, y2 = line_end
-
-        # Вычисляем векторное произведение
-        # (x2-x1)(y-y1) - (y2-y1)(x-x1)
-        # Это определяет, с какой стороны от линии находится точка
-        return (x2 - x1) * (y - y1) - (y2 - y1) * (x - x1)
+        """Определяет, с какой стороны от линии находится точка (см. `CountingEngine`)."""
+        return self.engine.point_position_relative_to_line(point, line_start, line_end)
 
     def get_optimized_frame(self):
         """Читает кадр, делает горизонтальное зеркало и возвращает копию для рисования."""
@@ -206,42 +157,7 @@ class PeopleCounter:
 
     def detect_people(self, frame):
         """Возвращает список `[x1, y1, x2, y2]` детекций класса person на кадре."""
-        # Ленивая загрузка модели при первом обращении в режиме подсчета
-        if self.model is None:
-            self.model = YOLO("yolov8n.pt")
-
-        # Запускаем YOLO для обнаружения только класса 'person' (индекс 0)
-        # Уменьшаем порог NMS для лучшего разделения близко стоящих людей
-        # Увеличиваем conf для уменьшения ложных срабатываний
-        results = self.model(
-            frame,
-            classes=0,
-            conf=0.35,  # Снижаем порог уверенности для обнаружения
-            iou=0.3,    # Уменьшаем IoU для лучшего разделения близких объектов
-            max_det=10  # Увеличиваем максимальное количество детекций
-        )
-
-        # Список для хранения координат обнаруженных людей
-        boxes = []
-
-        # Обрабатываем результаты детекции
-        for result in results:
-            # Перебираем все найденные объекты
-            for box in result.boxes:
-                # Получаем координаты рамки из результатов YOLO
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                conf = float(box.conf[0].cpu().numpy())
-
-                # Фильтруем по размеру рамки, чтобы исключить слишком маленькие детекции
-                box_width = x2 - x1
-                box_height = y2 - y1
-                min_size = 30  # Минимальный размер рамки в пикселях
-
-                if box_width > min_size and box_height > min_size:
-                    # Преобразуем координаты в целые числа и добавляем в список
-                    boxes.append([int(x1), int(y1), int(x2), int(y2)])
-
-        return boxes
+        return self.detector.detect(frame)
 
     def setup_preview(self):
         """Предпросмотр с линией для режима настройки."""
@@ -266,120 +182,30 @@ class PeopleCounter:
 
     def check_line_crossing(self, current_pos, previous_pos, line_start, line_end):
         """Проверяет факт пересечения линии и определяет направление (in/out)."""
-        # Если нет предыдущей позиции, пересечения быть не может
-        if previous_pos is None:
-            return False, None
-
-        # Определяем, с какой стороны линии находилась предыдущая позиция
-        prev_side = self.point_position_relative_to_line(
-            previous_pos, line_start, line_end
-        )
-        # Определяем, с какой стороны линии находится текущая позиция
-        curr_side = self.point_position_relative_to_line(
-            current_pos, line_start, line_end
+        return self.engine.check_line_crossing(
+            current_pos, previous_pos, line_start, line_end
         )
 
-        # Если знаки разные (произведение < 0), значит линия была пересечена
-        if (prev_side * curr_side) < 0:
-            # Получаем текущий угол линии для определения направления
-            angle = self.line_angle.get()
-
-            # В зависимости от угла наклона линии определяем направление
-            # Для углов 0-179 градусов:
-            #   - если prev_side > 0, человек двигается внутрь
-            #   - если prev_side < 0, человек двигается наружу
-            # Для углов 180-359 градусов - наоборот
-            if 0 <= angle < 180:
-                return True, "in" if prev_side > 0 else "out"
-            else:
-                return True, "in" if prev_side < 0 else "out"
-
-        # Если линия не была пересечена
-        return False, None
-
     def update_frame(self):
         """Детектирует, сопоставляет с предыдущими позициями и обновляет счетчик/кадр."""
         if not self.setup_mode:
             ret, frame, display_frame = self.get_optimized_frame()
             if ret:
-                line_start, line_end = self.get_line_points(
-                    frame.shape[1], frame.shape[0]
-                )
+                # Детекция, трекинг и проверка пересечений выполняются ядром подсчета
+                result = self.engine.process_frame(frame)
+                line_start, line_end = result.line
 
                 # Рисуем синюю линию подсчета
                 cv2.line(display_frame, line_start, line_end, (255, 0, 0), 2)
 
-                # Обнаруживаем людей на текущем кадре
-                people = self.detect_people(frame)
-
-                # Словарь для хранения текущих позиций людей
-                current_tracks = {}
-
-                # Сопоставляем текущие детекции с предыдущими позициями
-                used_prev_positions = set()
-                used_current_detections = set()
-
-                # Для каждой текущей детекции ищем ближайшую предыдущую позицию
-                for i, box in enumerate(people):
+                # Рисуем рамки и точки ног всех найденных людей
+                for _, box, foot_position, _ in result.tracks:
                     x1, y1, x2, y2 = box
-                    foot_position = (int((x1 + x2) / 2), y2)
-
-                    # Ищем ближайшую предыдущую позицию
-                    min_dist = float('inf')
-                    best_prev_id = None
-
-                    for prev_id, prev_pos in self.previous_positions.items():
-                        if prev_id in used_prev_positions:
-                            continue
-
-                        # Вычисляем расстояние между текущей и предыдущей позицией
-                        dist = math.sqrt(
-                            (foot_position[0] - prev_pos[0])**2 +
-                            (foot_position[1] - prev_pos[1])**2
-                        )
-
-                        # Если расстояние меньше порога и меньше предыдущего минимума
-                        if dist < 100 and dist < min_dist:  # 100 пикселей - максимальное допустимое перемещение
-                            min_dist = dist
-                            best_prev_id = prev_id
-
-                    # Если нашли соответствие
-                    if best_prev_id is not None:
-                        used_prev_positions.add(best_prev_id)
-                        used_current_detections.add(i)
-                        
-                        # Проверяем пересечение линии
-                        crossed, direction = self.check_line_crossing(
-                            foot_position,
-                            self.previous_positions[best_prev_id],
-                            line_start,
-                            line_end,
-                        )
-
-                        if crossed:
-                            if direction == "in":
-                                self.people_inside += 1
-                            else:
-                                self.people_inside = max(0, self.people_inside - 1)
-
-                        # Обновляем позицию для этого ID
-                        current_tracks[best_prev_id] = foot_position
-                    else:
-                        # Новая детекция - присваиваем новый ID
-                        new_id = max(self.previous_positions.keys(), default=-1) + 1
-                        current_tracks[new_id] = foot_position
-
-                    # Рисуем рамку и точку
                     cv2.rectangle(display_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
                     cv2.circle(display_frame, foot_position, 5, (0, 0, 255), -1)
 
                 # Обновляем счетчик на экране
-                self.count_label.config(
-                    text=f"Людей в помещении: {self.people_inside}"
-                )
-
-                # Обновляем словарь позиций
-                self.previous_positions = current_tracks
+                self.count_label.config(text=f"Людей в помещении: {result.count}")
 
                 # Конвертируем кадр для отображения в Tkinter
                 img = Image.fromarray(display_frame)
@@ -419,36 +245,22 @@ class PeopleCounter:
             # Освобождаем ресурсы камеры
             self.cap.release()
 
-    def process_video(self, input_path, output_path):
-        """Обрабатывает видео из файла (пока не реализовано полностью)"""
-        # Открываем видеофайл для чтения
-        cap = cv2.VideoCapture(input_path)
-
-        # Устанавливаем разрешение выходного видео 480p
-        target_width = 854  # Стандартная ширина для 480p
-        target_height = 480  # Стандартная высота для 480p
-
-        # Создаем объект для записи видео
-        fourcc = cv2.VideoWriter_fourcc(*"XVID")  # Кодек для сжатия
-        out = cv2.VideoWriter(
-            output_path,  # Путь для сохранения
-            fourcc,  # Используемый кодек
-            30.0,  # Частота кадров (FPS)
-            (target_width, target_height),  # Размер кадра
-        )
-
-        # Читаем и обрабатываем кадры из видео
-        while cap.isOpened():
-            # Читаем очередной кадр
-            ret, frame = cap.read()
-            if not ret:  # Если кадр не получен - выходим
-                break
+    def process_video(self, input_path, output_path=None, events_path=None, stride=1):
+        """Подсчитывает людей по видеофайлу с текущими настройками линии.
 
-            # Изменяем размер кадра до 480p
-            frame = cv2.resize(frame, (target_width, target_height))
-
-            # Записываем обработанный кадр
-            out.write(frame)
+        Возвращает `OfflineResult` с событиями пересечения и итоговым счетчиком.
+        """
+        result = count_video(
+            input_path,
+            output_path=output_path,
+            detector=self.detector,
+            line_position=self.engine.line_position,
+            line_angle=self.engine.line_angle,
+            stride=stride,
+        )
+        if events_path:
+            write_events(result.events, events_path)
+        return result
 
 
 def main():